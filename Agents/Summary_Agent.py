@@ -1,29 +1,55 @@
 # 📁 File: Agents/summary_agent.py
 
 import os
-import requests
+import json
 from dotenv import load_dotenv
 import streamlit as st
 
+from Agents import http_client
+from Agents.llm_stream import stream_chat
+from Agents.instrumentation import agent, registry
+from Agents.summary_cache import get_summary_cache, summary_key
+
 # ————————————————
 # Load environment
 # ————————————————
 load_dotenv()
 GROQ_KEY = os.getenv("GROQ_API_KEY")
-GROQ_URL = "https://api.groq.com/openai/v1/chat/completions"
+GROQ_URL = os.getenv("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
 GROQ_MODEL = "llama3-70b-8192"
 
+# Bump whenever the prompts below change so cached summaries are not reused
+PROMPT_VERSION = 2
+
+# Batch mode: prompt tokens per request and emails per request
+BATCH_TOKEN_BUDGET = int(os.getenv("SUMMARY_BATCH_TOKENS", "4000"))
+BATCH_MAX_EMAILS = 8
+
+
+def estimate_prompt_tokens(text: str) -> int:
+    """Rough prompt size: ~4 characters per token for English text."""
+    return len(text) // 4 + 1
+
+
+def fit_to_budget(text: str, token_budget: int = None) -> str:
+    """`text` cut to roughly `token_budget` prompt tokens; unchanged without a budget."""
+    return text[:token_budget * 4] if token_budget else text
+
 
 # ————————————————
 # Summary Logic
 # ————————————————
+@agent("summary")
 class SummaryAgent:
-    def __init__(self, api_key: str, api_url: str, model: str):
+    def __init__(self, api_key: str, api_url: str, model: str, temperature: float = 0.4, cache=None):
         self.api_key = api_key
         self.api_url = api_url
         self.model = model
+        self.temperature = temperature
+        self.cache = cache or get_summary_cache()
 
-    def summarize_email(self, subject: str, body: str) -> str:
+    def build_payload(self, subject: str, body: str, token_budget: int = None) -> dict:
+        body = fit_to_budget(body, token_budget)
         prompt = (
             f"You are a highly accurate email summarizer powered by Groq + LLaMA.\n\n"
             f"Summarize this email for a busy operations team:\n"
@@ -31,28 +57,135 @@ class SummaryAgent:
             f"Subject: {subject}\n"
             f"Body:\n{body}\n"
         )
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": "You summarize emails concisely."},
+                {"role": "user", "content": prompt},
+            ],
+            "temperature": self.temperature,
+        }
+
+    def _cache_key(self, subject: str, body: str) -> str:
+        return summary_key(subject, body, self.model, self.temperature, PROMPT_VERSION)
+
+    def cached_summary(self, subject: str, body: str):
+        """Returns a previously generated summary, or None."""
+        return self.cache.get(self._cache_key(subject, body))
+
+    def request_summary(self, subject: str, body: str, on_token=None, token_budget: int = None) -> str:
+        """
+        Calls Groq once and caches the result; raises `requests` errors (e.g. HTTP 429)
+        to the caller. Only real summaries are cached, never errors or empty replies.
+        With `on_token`, the reply is streamed and each text delta is passed to it as it arrives.
+        With `token_budget`, a longer body is cut to fit before it is sent.
+        """
+        payload = self.build_payload(subject, body, token_budget)
+        if on_token:
+            parts = []
+            for delta in stream_chat(self.api_url, self.api_key, payload):
+                parts.append(delta)
+                on_token(delta)
+            summary = "".join(parts).strip()
+        else:
+            choices = self._post(payload).get("choices", [])
+            summary = choices[0]["message"]["content"].strip() if choices else ""
+
+        if summary:
+            self.cache.put(self._cache_key(subject, body), summary)
+            return summary
+        return "⚠️ No summary returned."
 
+    def _post(self, payload: dict) -> dict:
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
         }
-        payload = {
+        resp = http_client.post(self.api_url, "groq", headers=headers, json=payload)
+        resp.raise_for_status()
+        data = resp.json()
+        registry.record_usage(payload.get("model"), data.get("usage"))
+        return data
+
+    # ————————————————
+    # Batch mode
+    # ————————————————
+    def pack_batches(self, emails: list, token_budget: int = BATCH_TOKEN_BUDGET) -> list:
+        """
+        Groups email indices into batches whose combined prompt stays under `token_budget`.
+        An email that alone exceeds the budget gets a batch of its own and is cut to the
+        budget when it is sent.
+        """
+        batches, current, used = [], [], 0
+        for idx, email in enumerate(emails):
+            cost = estimate_prompt_tokens(email["subject"] + email["body"])
+            if current and (used + cost > token_budget or len(current) >= BATCH_MAX_EMAILS):
+                batches.append(current)
+                current, used = [], 0
+            current.append(idx)
+            used += cost
+        if current:
+            batches.append(current)
+        return batches
+
+    def build_batch_payload(self, emails: list, token_budget: int = BATCH_TOKEN_BUDGET) -> dict:
+        # Packing keeps multi-email batches under budget; no single body may exceed it either
+        blocks = [
+            f"### Email {i}\nSubject: {email['subject']}\nBody:\n{fit_to_budget(email['body'], token_budget)}\n"
+            for i, email in enumerate(emails, start=1)
+        ]
+        prompt = (
+            f"You are a highly accurate email summarizer powered by Groq + LLaMA.\n\n"
+            f"Summarize each of the following {len(emails)} emails for a busy operations team.\n"
+            f"Return only a JSON object mapping each email number to its summary, e.g. "
+            f'{{"1": "...", "2": "..."}}.\n'
+            f"---\n" + "\n".join(blocks)
+        )
+        return {
             "model": self.model,
             "messages": [
-                {"role": "system", "content": "You summarize emails concisely."},
+                {"role": "system", "content": "You summarize emails concisely and reply with JSON only."},
                 {"role": "user", "content": prompt},
             ],
-            "temperature": 0.4,
+            "temperature": self.temperature,
+            "response_format": {"type": "json_object"},
         }
 
+    def request_batch(self, emails: list, token_budget: int = BATCH_TOKEN_BUDGET) -> list:
+        """
+        Summarizes several emails in one Groq call. Returns summaries aligned with `emails`;
+        items missing or malformed in the reply are None. Raises `requests` errors.
+        """
+        data = self._post(self.build_batch_payload(emails, token_budget))
+        choices = data.get("choices", [])
         try:
-            resp = requests.post(self.api_url, headers=headers, json=payload)
-            resp.raise_for_status()
-            data = resp.json()
-            choices = data.get("choices", [])
-            if choices:
-                return choices[0]["message"]["content"].strip()
-            return "⚠️ No summary returned."
+            parsed = json.loads(choices[0]["message"]["content"]) if choices else {}
+        except (ValueError, KeyError, TypeError):
+            parsed = {}
+        if not isinstance(parsed, dict):
+            parsed = {}
+
+        results = []
+        for i, email in enumerate(emails, start=1):
+            summary = parsed.get(str(i))
+            if isinstance(summary, str) and summary.strip():
+                summary = summary.strip()
+                self.cache.put(self._cache_key(email["subject"], email["body"]), summary)
+                results.append(summary)
+            else:
+                results.append(None)
+        return results
+
+    def summarize_email(self, subject: str, body: str, on_token=None) -> str:
+        """Cached summary if there is one, otherwise a fresh one (streamed to `on_token` if given)."""
+        cached = self.cached_summary(subject, body)
+        if cached is not None:
+            return cached
+        return self._summarize_uncached(subject, body, on_token)
+
+    def _summarize_uncached(self, subject: str, body: str, on_token=None) -> str:
+        try:
+            return self.request_summary(subject, body, on_token)
         except Exception as e:
             return f"❌ Error: {e}"
 
@@ -81,10 +214,15 @@ def main():
             st.error("❌ GROQ_API_KEY missing in .env")
         else:
             agent = SummaryAgent(GROQ_KEY, GROQ_URL, GROQ_MODEL)
-            with st.spinner("Summarizing…"):
-                summary = agent.summarize_email(subject, body)
             st.subheader("📋 Summary")
-            st.write(summary)
+            placeholder = st.empty()
+            streamed = []
+
+            def on_token(delta):
+                streamed.append(delta)
+                placeholder.markdown("".join(streamed) + "▌")
+
+            placeholder.write(agent.summarize_email(subject, body, on_token))
 
 
 if __name__ == "__main__":
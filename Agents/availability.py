@@ -0,0 +1,125 @@
+import datetime
+from bisect import bisect_left, bisect_right
+
+from Agents.registry import thread_http
+
+# The freebusy API accepts at most this many calendars per query
+FREEBUSY_MAX_ITEMS = 50
+
+
+def parse_api_time(value):
+    """Parses an RFC 3339 timestamp from the Google APIs into a naive UTC datetime."""
+    dt = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+class BusyIndex:
+    """
+    Per-attendee sorted, merged busy intervals (naive UTC datetimes).
+    Answers "who is busy at T" and "is everyone free in [a, b)" without network calls.
+    Calendars Google reports errors for (e.g. no access) are listed in `errors` and have no
+    busy time; attendees in `unverified` could not be queried at all and are treated as busy.
+    """
+
+    def __init__(self):
+        self._intervals = {}
+        self._starts = {}
+        self._ends = {}
+        self.errors = {}
+        self.unverified = set()
+
+    def add_attendee(self, email, intervals):
+        merged = []
+        for start, end in sorted(intervals):
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        self._intervals[email] = merged
+        self._starts[email] = [s for s, _ in merged]
+        self._ends[email] = [e for _, e in merged]
+
+    def add_error(self, email, reason, unverified=False):
+        self.errors[email] = reason
+        if unverified:
+            self.unverified.add(email)
+        else:
+            self.add_attendee(email, [])
+
+    @property
+    def attendees(self):
+        return list(self._intervals) + [e for e in self.unverified if e not in self._intervals]
+
+    def intervals(self, email):
+        return list(self._intervals.get(email, []))
+
+    def is_busy(self, email, start, end):
+        """True when `email` has a busy interval overlapping [start, end), or is unverified."""
+        if email in self.unverified:
+            return True
+        starts = self._starts.get(email, [])
+        # Last interval beginning before `end` is the only one that can still overlap
+        i = bisect_left(starts, end) - 1
+        return i >= 0 and self._ends[email][i] > start
+
+    def busy_at(self, t):
+        """Attendees that are busy (or unverified) at instant `t`."""
+        busy = list(self.unverified)
+        for email, starts in self._starts.items():
+            i = bisect_right(starts, t) - 1
+            if i >= 0 and self._ends[email][i] > t:
+                busy.append(email)
+        return busy
+
+    def busy_attendees(self, start, end):
+        """Every attendee that is busy (or unverified) somewhere in [start, end)."""
+        return [email for email in self.attendees if self.is_busy(email, start, end)]
+
+    def all_free(self, start, end):
+        return not self.busy_attendees(start, end)
+
+
+def load_busy_index(service, emails, time_min, time_max, store=None):
+    """
+    Loads busy intervals for all `emails` between `time_min` and `time_max` (naive UTC).
+    Calendars mirrored in the EventStore `store` are brought up to date and read locally;
+    the rest go through one freebusy query per FREEBUSY_MAX_ITEMS calendars.
+    """
+    index = BusyIndex()
+    emails = list(dict.fromkeys(emails))
+
+    if store is not None:
+        store.refresh(service, emails)
+        mirrored = [email for email in emails if store.covers(email, time_min, time_max)]
+        for email in mirrored:
+            index.add_attendee(email, store.busy_intervals(email, time_min, time_max))
+        emails = [email for email in emails if email not in mirrored]
+
+    for i in range(0, len(emails), FREEBUSY_MAX_ITEMS):
+        chunk = emails[i:i + FREEBUSY_MAX_ITEMS]
+        try:
+            result = service.freebusy().query(body={
+                "timeMin": time_min.isoformat() + "Z",
+                "timeMax": time_max.isoformat() + "Z",
+                "items": [{"id": email} for email in chunk]
+            }).execute(http=thread_http(service))
+        except Exception as e:
+            print(f"⚠️ Freebusy query failed for {len(chunk)} attendees: {e}")
+            for email in chunk:
+                index.add_error(email, str(e), unverified=True)
+            continue
+
+        calendars = result.get("calendars", {})
+        for email in chunk:
+            calendar = calendars.get(email, {})
+            if calendar.get("errors"):
+                index.add_error(email, calendar["errors"][0].get("reason", "unknown"))
+                continue
+            index.add_attendee(email, [
+                (parse_api_time(b["start"]), parse_api_time(b["end"]))
+                for b in calendar.get("busy", [])
+            ])
+
+    return index
@@ -1,66 +1,63 @@
-import os
 import uuid
-import pickle
 import base64
 import datetime
 from email.mime.text import MIMEText
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
-from .email_utils import send_email
+from .email_utils import build_email_template, render_email
+from .outbox import get_outbox
+from .availability import load_busy_index
+from .event_store import get_event_store
+from .registry import build_service, thread_http
+from .credentials import get_credential_provider
+from .instrumentation import agent
 from Agents.llm_negotiator import suggest_meeting_time  # 🧠 LLaMA + history-based negotiation
 
+@agent("calendar")
 class CalendarAgent:
-    def __init__(self):
-        token_path = "token.pkl"
-        if not os.path.exists(token_path):
-            raise FileNotFoundError("❌ token.pkl not found. Please complete Google OAuth flow first.")
-
-        with open(token_path, "rb") as token_file:
-            self.creds = pickle.load(token_file)
+    def __init__(self, credentials=None):
+        self.credentials = credentials or get_credential_provider()
+        self.creds = self.credentials.credentials
 
         print("✅ Loaded credentials.")
 
-        self.service = build("calendar", "v3", credentials=self.creds)
-        self.gmail_service = build("gmail", "v1", credentials=self.creds)
-        self.user_name = self._get_authenticated_user_name()
-        self.user_email = self._get_authenticated_user_email()
+        self.service = build_service("calendar", "v3", self.creds)
+        self.gmail_service = build_service("gmail", "v1", self.creds)
 
-        print(f"✅ Authenticated as {self.user_name} ({self.user_email})")
+        # One userinfo round trip serves both the display name and the email
+        user_info = self._get_authenticated_user_info()
+        self.user_name = user_info.get("name", "OpsPilot User")
+        self.user_email = user_info.get("email", "no-reply@opspilot.dev")
 
-    def _get_authenticated_user_name(self):
-        try:
-            user_info = build("oauth2", "v2", credentials=self.creds).userinfo().get().execute()
-            return user_info.get("name", "OpsPilot User")
-        except Exception as e:
-            print(f"⚠️ Failed to fetch user name: {e}")
-            return "OpsPilot User"
+        print(f"✅ Authenticated as {self.user_name} ({self.user_email})")
 
-    def _get_authenticated_user_email(self):
+    def _get_authenticated_user_info(self):
         try:
-            user_info = build("oauth2", "v2", credentials=self.creds).userinfo().get().execute()
-            return user_info.get("email", "no-reply@opspilot.dev")
+            return build_service("oauth2", "v2", self.creds).userinfo().get().execute()
         except Exception as e:
-            print(f"⚠️ Failed to fetch user email: {e}")
-            return "no-reply@opspilot.dev"
+            print(f"⚠️ Failed to fetch user info: {e}")
+            return {}
+
+    def load_busy_index(self, attendees, time_min, time_max):
+        """Busy intervals for all attendees in [time_min, time_max), from mirrored calendars or bulk freebusy queries."""
+        return load_busy_index(self.service, [email for _, email, _ in attendees], time_min, time_max,
+                               store=get_event_store())
+
+    def find_busy_attendees(self, attendees, start_time, end_time):
+        """Emails of every attendee busy (or whose availability could not be checked) in [start_time, end_time)."""
+        print(f"🔍 Checking availability for {len(attendees)} attendees from {start_time} to {end_time}...")
+        index = self.load_busy_index(attendees, start_time, end_time)
+        for email, reason in index.errors.items():
+            print(f"⚠️ Could not check availability for {email}: {reason}")
+        busy = index.busy_attendees(start_time, end_time)
+        for email in busy:
+            if email not in index.unverified:
+                print(f"⛔ {email} is busy at that time: {index.intervals(email)}")
+        return busy
 
     def check_availability(self, attendees, start_time, end_time):
-        for _, email, _ in attendees:
-            try:
-                print(f"🔍 Checking availability for {email} from {start_time} to {end_time}...")
-                events_result = self.service.freebusy().query(body={
-                    "timeMin": start_time.isoformat() + "Z",
-                    "timeMax": end_time.isoformat() + "Z",
-                    "items": [{"id": email}]
-                }).execute()
-
-                busy_times = events_result.get("calendars", {}).get(email, {}).get("busy", [])
-                if busy_times:
-                    print(f"⛔ {email} is busy at that time: {busy_times}")
-                    return False
-            except Exception as e:
-                print(f"⚠️ Could not check availability for {email}: {e}")
-                return False
+        if self.find_busy_attendees(attendees, start_time, end_time):
+            return False
         print("✅ All attendees are available.")
         return True
 
@@ -85,8 +82,9 @@ class CalendarAgent:
             time_str = start_time.strftime("%A, %d %B %Y at %H:%M UTC")
             print(f"🕒 Scheduling from {start_time} to {end_time}")
 
-            if not self.check_availability(attendees, start_time, end_time):
-                return "❌ One or more attendees are busy during the suggested time."
+            busy = self.find_busy_attendees(attendees, start_time, end_time)
+            if busy:
+                return f"❌ These attendees are busy during the suggested time: {', '.join(busy)}"
 
             attendee_list = [{"email": email} for _, email, _ in attendees]
             if self.user_email not in [a["email"] for a in attendee_list]:
@@ -115,7 +113,7 @@ class CalendarAgent:
                 body=event,
                 conferenceDataVersion=1,
                 sendUpdates="all"
-            ).execute()
+            ).execute(http=thread_http(self.service))
 
             print("✅ Event created:", created)
 
@@ -126,13 +124,11 @@ class CalendarAgent:
             calendar_link = created.get("htmlLink", "#")
             meet_link = created.get("conferenceData", {}).get("entryPoints", [{}])[0].get("uri", "No Meet Link")
 
-            print("📧 Sending invitations...")
-            for name, email, role in attendees:
-                self._send_invitation_email(name, email, role, topic, start_time, end_time, meet_link, calendar_link)
-
+            print("📧 Queueing invitations...")
+            self._queue_invitations(created["id"], attendees, topic, start_time, meet_link, calendar_link)
 
             names = ", ".join([f"{n} ({r})" for n, _, r in attendees])
-            return f"""✅ Meeting Scheduled with: **{names}**\n\n📝 **Topic:** {topic}  \n📅 **Time:** {time_str}  \n🔗 [Calendar Link]({calendar_link})  \n📹 Meet Link: {meet_link}"""
+            return f"""✅ Meeting Scheduled with: **{names}**\n\n📝 **Topic:** {topic}  \n📅 **Time:** {time_str}  \n🔗 [Calendar Link]({calendar_link})  \n📹 Meet Link: {meet_link}  \n📬 Invitations are being delivered in the background."""
 
         except HttpError as err:
             print(f"❌ Google Calendar API Error: {err}")
@@ -141,7 +137,8 @@ class CalendarAgent:
             print(f"❌ General Error: {e}")
             return f"❌ Error: {e}"
 
-    def _send_invitation_email(self, name, email, role, topic, start_time, end_time, meet_link, calendar_link):
+    def _queue_invitations(self, event_id, attendees, topic, start_time, meet_link, calendar_link):
+        """Renders the invitation once and hands one personalized copy per attendee to the outbox."""
         time_str = start_time.strftime("%A, %d %B %Y at %H:%M")
         body = f"""You're invited to a meeting by {self.user_name}.
 
@@ -152,6 +149,10 @@ class CalendarAgent:
 
 – {self.user_name}
 """
-        print(f"📨 Sending email to {email}...")
-        send_email(self.gmail_service, email, f"Meeting Invite: {topic} from {self.user_name}", body)
-        print(f"✅ Email sent to {email}.")
+        template = build_email_template(f"Meeting Invite: {topic} from {self.user_name}", body)
+        get_outbox().enqueue(
+            event_id,
+            topic,
+            [(email, render_email(template, email)) for _, email, _ in attendees],
+        )
+        print(f"📬 Queued {len(attendees)} invitations for event {event_id}.")
@@ -0,0 +1,215 @@
+import os
+import time
+import pickle
+import datetime
+import tempfile
+import threading
+from google.auth.transport.requests import Request
+
+from Agents.sessions import scoped, user_scope, user_slug
+
+TOKEN_PATH = "token.pkl"
+CLIENT_SECRETS_PATH = "credentials.json"
+REFRESH_MARGIN = 300      # refresh this many seconds before the access token expires
+CHECK_INTERVAL = 60       # how often the background thread looks at the expiry
+
+# Multi-user mode: one token file per signed-in Google account, written by the web sign-in flow
+TOKEN_DIR = os.getenv("OPSPILOT_TOKEN_DIR", "tokens")
+OAUTH_REDIRECT_URI = os.getenv("OPSPILOT_OAUTH_REDIRECT_URI", "http://localhost:8501")
+SIGN_IN_TTL = 600         # seconds a started sign-in may take to come back
+
+# Define the scopes for Google API access
+SCOPES = [
+    "https://www.googleapis.com/auth/calendar",
+    "https://www.googleapis.com/auth/calendar.events",
+    "https://www.googleapis.com/auth/calendar.readonly",
+    "https://www.googleapis.com/auth/calendar.freebusy",
+    "https://www.googleapis.com/auth/gmail.readonly",
+    "https://www.googleapis.com/auth/gmail.send",
+    "https://www.googleapis.com/auth/gmail.modify",
+    "https://www.googleapis.com/auth/userinfo.email",
+    "https://www.googleapis.com/auth/userinfo.profile",
+    "openid"
+]
+
+
+class CredentialProvider:
+    """
+    Holds one Google account's credentials in memory for every agent acting for it.
+    A daemon thread refreshes the access token REFRESH_MARGIN seconds before it expires,
+    so user-facing requests always find a valid token. Refreshes are serialized with a
+    lock and written back to `token_path` atomically.
+    """
+
+    def __init__(self, token_path=TOKEN_PATH, creds=None, auto_refresh=True, interactive=True):
+        self.token_path = token_path
+        self.interactive = interactive
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._creds = creds or self._load()
+
+        if auto_refresh and self._creds.refresh_token:
+            self._thread = threading.Thread(target=self._run, name="credential-refresh", daemon=True)
+            self._thread.start()
+
+    @property
+    def credentials(self):
+        """The shared google.auth credentials object; refreshed in place, so services always see the current token."""
+        return self._creds
+
+    def token(self):
+        """Current access token. Only refreshes inline if the background thread fell behind."""
+        with self._lock:
+            if self._expires_within(0) or not self._creds.token:
+                self._refresh_locked()
+            return self._creds.token
+
+    def stop(self):
+        self._stop.set()
+
+    # ------------------------
+    # Internals
+    # ------------------------
+    def _load(self):
+        if os.path.exists(self.token_path):
+            with open(self.token_path, "rb") as token_file:
+                creds = pickle.load(token_file)
+            if creds.valid or creds.refresh_token:
+                return creds
+
+        if not self.interactive:
+            raise FileNotFoundError(f"❌ {self.token_path} not found. Please sign in with Google again.")
+        if not os.path.exists(CLIENT_SECRETS_PATH):
+            raise FileNotFoundError(f"❌ {self.token_path} not found. Please complete Google OAuth flow first.")
+
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRETS_PATH, SCOPES)
+        creds = flow.run_local_server(port=0)
+        self._save(creds)
+        return creds
+
+    def _expires_within(self, seconds):
+        expiry = self._creds.expiry
+        if expiry is None:
+            return not self._creds.valid
+        return expiry - datetime.datetime.utcnow() <= datetime.timedelta(seconds=seconds)
+
+    def _refresh_locked(self):
+        # Another process serving the same token file may already have refreshed it
+        on_disk = self._read_disk()
+        if on_disk and on_disk.expiry and self._creds.expiry and on_disk.expiry > self._creds.expiry:
+            self._creds.token = on_disk.token
+            self._creds.expiry = on_disk.expiry
+            if not self._expires_within(REFRESH_MARGIN):
+                return
+
+        self._creds.refresh(Request())
+        self._save(self._creds)
+        print(f"🔑 Refreshed Google access token (expires {self._creds.expiry} UTC).")
+
+    def _read_disk(self):
+        try:
+            with open(self.token_path, "rb") as token_file:
+                return pickle.load(token_file)
+        except Exception:
+            return None
+
+    def _save(self, creds):
+        # Write to a temp file in the same directory, then atomically swap it in
+        directory = os.path.dirname(os.path.abspath(self.token_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".token-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                pickle.dump(creds, tmp_file)
+            os.replace(tmp_path, self.token_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with self._lock:
+                    if self._expires_within(REFRESH_MARGIN):
+                        self._refresh_locked()
+            except Exception as e:
+                print(f"⚠️ Background token refresh failed: {e}")
+            self._stop.wait(CHECK_INTERVAL)
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_credential_provider():
+    """CredentialProvider of the signed-in user, or the process-wide one for token.pkl."""
+    return scoped(
+        "credentials",
+        lambda session: CredentialProvider(token_path=token_path_for(session.user), interactive=False),
+        _shared_provider,
+    )
+
+
+def credential_provider_for(user):
+    """CredentialProvider of `user` (None for token.pkl), for background work done on their behalf."""
+    with user_scope(user):
+        return get_credential_provider()
+
+
+def _shared_provider():
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = CredentialProvider()
+    return _provider
+
+
+def token_path_for(user):
+    return os.path.join(TOKEN_DIR, user_slug(user) + ".pkl")
+
+
+# ------------------------
+# Web sign-in (multi-user mode)
+# ------------------------
+_pending_sign_ins = {}    # OAuth state -> (PKCE code verifier, started at)
+_pending_lock = threading.Lock()
+
+
+def _web_flow(state=None):
+    from google_auth_oauthlib.flow import Flow
+    return Flow.from_client_secrets_file(CLIENT_SECRETS_PATH, SCOPES, state=state, redirect_uri=OAUTH_REDIRECT_URI)
+
+
+def sign_in_url():
+    """Google consent URL for a new sign-in; the state is remembered until the redirect comes back."""
+    flow = _web_flow()
+    url, state = flow.authorization_url(access_type="offline", prompt="consent", include_granted_scopes="true")
+    now = time.time()
+    with _pending_lock:
+        for old in [s for s, (_, started) in _pending_sign_ins.items() if now - started > SIGN_IN_TTL]:
+            del _pending_sign_ins[old]
+        _pending_sign_ins[state] = (flow.code_verifier, now)
+    return url
+
+
+def complete_sign_in(code, state):
+    """
+    Exchanges the authorization `code` of a redirect for tokens, stores them under the
+    account's email in TOKEN_DIR and returns that email. Unknown or expired states are rejected.
+    """
+    with _pending_lock:
+        verifier, started = _pending_sign_ins.pop(state, (None, 0))
+    if verifier is None or time.time() - started > SIGN_IN_TTL:
+        raise ValueError("❌ Sign-in link expired or was already used. Please sign in again.")
+
+    flow = _web_flow(state)
+    flow.code_verifier = verifier
+    flow.fetch_token(code=code)
+    creds = flow.credentials
+
+    from Agents.registry import build_service
+    email = build_service("oauth2", "v2", creds).userinfo().get().execute()["email"]
+    os.makedirs(TOKEN_DIR, exist_ok=True)
+    CredentialProvider(token_path=token_path_for(email), creds=creds, auto_refresh=False)._save(creds)
+    return email
@@ -1,35 +1,21 @@
 import streamlit as st
-from datetime import datetime, timedelta
+from datetime import datetime
+
+from Agents.metrics import get_dashboard_metrics
 
 def display_dashboard(inbox, calendar):
     st.header("📊 Team Activity Dashboard")
 
     with st.spinner("🔄 Fetching real-time data..."):
-        # Unread emails (cached)
-        emails = inbox.fetch_all_emails(query="is:unread", max_results=100)
-        unread_count = len(emails)
-
-        # Recent meetings
-        now = datetime.utcnow().isoformat() + "Z"
-        week_ago = (datetime.utcnow() - timedelta(days=7)).isoformat() + "Z"
-        events = calendar.service.events().list(
-            calendarId="primary",
-            timeMin=week_ago,
-            timeMax=now,
-            singleEvents=True,
-            orderBy="startTime"
-        ).execute().get("items", [])
-        meeting_count = len(events)
-        participants = {
-            att["email"]
-            for ev in events
-            for att in ev.get("attendees", [])
-            if att.get("email")
-        }
-        unique_participants = len(participants)
+        # Label statistics + cached event window, gathered concurrently
+        metrics = get_dashboard_metrics(inbox, calendar)
 
     c1, c2, c3 = st.columns(3)
-    c1.metric("📬 Unread Emails", unread_count)
-    c2.metric("📅 Meetings (7d)", meeting_count)
-    c3.metric("👥 Participants", unique_participants)
-    st.caption("⚡ Powered by Gmail + Google Calendar APIs")
+    c1.metric("📬 Unread Emails", metrics["unread_count"])
+    c2.metric("📅 Meetings (7d)", "—" if metrics["meeting_count"] is None else metrics["meeting_count"])
+    c3.metric("👥 Participants", "—" if metrics["unique_participants"] is None else metrics["unique_participants"])
+    if metrics["calendar_error"]:
+        stale = "" if metrics["meeting_count"] is None else " Showing the last synced events."
+        st.warning(f"⚠️ Could not sync Google Calendar: {metrics['calendar_error']}.{stale}")
+    updated = datetime.fromtimestamp(metrics["fetched_at"]).strftime("%H:%M:%S")
+    st.caption(f"⚡ Powered by Gmail + Google Calendar APIs · updated {updated}")
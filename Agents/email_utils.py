@@ -4,49 +4,68 @@ from email.mime.base import MIMEBase
 import base64
 import datetime
 
-def send_email(gmail_service, to_email, subject, body, start_time=None, end_time=None, meet_link=None):
-    try:
-        # Create multipart message
-        message = MIMEMultipart("mixed")
-        message["to"] = to_email
-        message["from"] = "me"
-        message["subject"] = subject
-
-        # Add plain text part
-        text_part = MIMEText(body, "plain")
-        message.attach(text_part)
-
-        # Optional: Add .ics calendar invite
-        if start_time and end_time:
-            start_str = start_time.strftime("%Y%m%dT%H%M%SZ")
-            end_str = end_time.strftime("%Y%m%dT%H%M%SZ")
-            uid = f"{start_str}-{to_email}"
-
-            ical = f"""BEGIN:VCALENDAR
+ICS_TEMPLATE = """BEGIN:VCALENDAR
 VERSION:2.0
 PRODID:-//OpsPilot//CalendarAgent//EN
 METHOD:REQUEST
 BEGIN:VEVENT
-UID:{uid}
-DTSTAMP:{datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")}
+UID:{start_str}-{to_email}
+DTSTAMP:{dtstamp}
 DTSTART:{start_str}
 DTEND:{end_str}
 SUMMARY:{subject}
 DESCRIPTION:{body}
-LOCATION:{meet_link or 'Google Meet'}
+LOCATION:{location}
 ORGANIZER;CN=OpsPilot:mailto:me
 ATTENDEE;CN={to_email};RSVP=TRUE:mailto:{to_email}
 STATUS:CONFIRMED
 SEQUENCE:0
 TRANSP:OPAQUE
 END:VEVENT
-END:VCALENDAR""".replace("\n", "\r\n")
+END:VCALENDAR"""
+
+
+def build_email_template(subject, body, start_time=None, end_time=None, meet_link=None):
+    """
+    Renders everything recipients share exactly once: the plain-text part and,
+    when times are given, the .ics invite with only the recipient left to fill in.
+    """
+    template = {"subject": subject, "body": body, "text_part": MIMEText(body, "plain"), "ics": None}
 
-            calendar_part = MIMEText(ical, "calendar;method=REQUEST")
-            message.attach(calendar_part)
+    # Optional: Add .ics calendar invite
+    if start_time and end_time:
+        template["ics"] = ICS_TEMPLATE.replace("\n", "\r\n").format(
+            start_str=start_time.strftime("%Y%m%dT%H%M%SZ"),
+            end_str=end_time.strftime("%Y%m%dT%H%M%SZ"),
+            dtstamp=datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%SZ"),
+            subject=subject,
+            body=body,
+            location=meet_link or 'Google Meet',
+            to_email="{to_email}",
+        )
+    return template
 
-        # Encode to base64 for Gmail API
-        raw = base64.urlsafe_b64encode(message.as_bytes()).decode()
+
+def render_email(template, to_email):
+    """Personalizes a template for one recipient and returns the base64url raw message for Gmail."""
+    # Create multipart message
+    message = MIMEMultipart("mixed")
+    message["to"] = to_email
+    message["from"] = "me"
+    message["subject"] = template["subject"]
+    message.attach(template["text_part"])
+
+    if template["ics"]:
+        calendar_part = MIMEText(template["ics"].replace("{to_email}", to_email), "calendar;method=REQUEST")
+        message.attach(calendar_part)
+
+    # Encode to base64 for Gmail API
+    return base64.urlsafe_b64encode(message.as_bytes()).decode()
+
+
+def send_email(gmail_service, to_email, subject, body, start_time=None, end_time=None, meet_link=None):
+    try:
+        raw = render_email(build_email_template(subject, body, start_time, end_time, meet_link), to_email)
 
         print("📧 Sending email to:", to_email)
         print("🔸 Subject:", subject)
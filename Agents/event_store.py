@@ -0,0 +1,326 @@
+import os
+import json
+import time
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from googleapiclient.errors import HttpError
+
+from Agents.storage import cache_path, connect
+from Agents.sessions import scoped, USER_SQLITE_CACHE_KIB
+from Agents.instrumentation import bind, registry
+from Agents.registry import thread_http
+from Agents.availability import parse_api_time
+
+SCHEMA_VERSION = 1
+
+# Each mirror covers this window around its last full sync; incremental syncs keep it current
+MIRROR_PAST_DAYS = int(os.getenv("OPSPILOT_EVENT_MIRROR_PAST_DAYS", "30"))
+MIRROR_FUTURE_DAYS = int(os.getenv("OPSPILOT_EVENT_MIRROR_FUTURE_DAYS", "60"))
+MIN_FUTURE_DAYS = 14        # a full sync is repeated once less than this much future is covered
+SYNC_INTERVAL = 60          # seconds a mirror counts as current without asking Google again
+ERROR_RETRY = 600           # seconds before an unreadable calendar is tried again
+IDLE_DAYS = 30              # mirrors nobody read for this long are dropped
+MAX_SYNC_WORKERS = 8
+SYNC_LOCK_STRIPES = 32      # calendars share this many sync locks, so the lock set stays bounded
+
+# Only what availability, routines and the dashboard need; titles and descriptions are never fetched
+EVENT_FIELDS = (
+    "nextPageToken,nextSyncToken,"
+    "items(id,status,start,end,transparency,attendees(email,self,responseStatus,resource))"
+)
+
+SCHEMA = """
+CREATE TABLE calendars (
+    calendar_id TEXT PRIMARY KEY,
+    sync_token TEXT,
+    window_start REAL,
+    window_end REAL,
+    synced_at REAL,
+    changed_at REAL,
+    last_access REAL,
+    error TEXT
+);
+CREATE TABLE events (
+    calendar_id TEXT,
+    event_id TEXT,
+    start_ts REAL,
+    end_ts REAL,
+    all_day INTEGER,
+    transparent INTEGER,
+    declined INTEGER,
+    attendees TEXT,
+    PRIMARY KEY (calendar_id, event_id)
+);
+CREATE INDEX events_time ON events (calendar_id, start_ts);
+"""
+
+
+class EventStore:
+    """
+    Local mirror of Google Calendar events, one per calendar id.
+    The first sync lists the MIRROR_PAST_DAYS / MIRROR_FUTURE_DAYS window page by page; later
+    syncs send the stored syncToken and apply only what changed. An expired token (HTTP 410)
+    or a window running out of future triggers a new full sync.
+    """
+
+    def __init__(self, path=None, cache_kib=None):
+        self._lock = threading.Lock()
+        self._sync_locks = [threading.Lock() for _ in range(SYNC_LOCK_STRIPES)]
+        self._conn = connect(path or cache_path("events.db"), SCHEMA_VERSION, SCHEMA, cache_kib)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------
+    # Sync
+    # ------------------------
+    def sync(self, service, calendar_id, http=None, max_age=SYNC_INTERVAL):
+        """
+        Brings the mirror of `calendar_id` up to date, unless it was synced in the last `max_age`
+        seconds. Returns False when the calendar cannot be read (the error is kept in `error`).
+        """
+        with self._sync_locks[hash(calendar_id) % SYNC_LOCK_STRIPES]:
+            state = self._state(calendar_id)
+            now = time.time()
+            if state and state["error"]:
+                if now - state["synced_at"] < ERROR_RETRY:
+                    return False
+                state = None
+            if state and now - state["synced_at"] < max_age:
+                return True
+
+            try:
+                if state and state["sync_token"] and state["window_end"] - now > MIN_FUTURE_DAYS * 86400:
+                    try:
+                        self._incremental_sync(service, calendar_id, state["sync_token"], http)
+                        registry.record_cache("events", True)
+                        return True
+                    except HttpError as e:
+                        if e.resp.status != 410:
+                            raise
+                        print(f"⚠️ Sync token for {calendar_id} expired; running a full sync.")
+                self._full_sync(service, calendar_id, http)
+                registry.record_cache("events", False)
+                return True
+            except Exception as e:
+                print(f"⚠️ Could not sync events for {calendar_id}: {e}")
+                self._set_error(calendar_id, str(e))
+                return False
+
+    def refresh(self, service, calendar_ids, max_age=SYNC_INTERVAL):
+        """Concurrently syncs the calendars in `calendar_ids` that are already mirrored."""
+        mirrored = [c for c in calendar_ids if self.has_mirror(c)]
+        if not mirrored:
+            return
+        with ThreadPoolExecutor(max_workers=min(MAX_SYNC_WORKERS, len(mirrored))) as pool:
+            list(pool.map(
+                bind(lambda calendar_id: self.sync(service, calendar_id, thread_http(service), max_age)), mirrored
+            ))
+
+    def _full_sync(self, service, calendar_id, http):
+        now = time.time()
+        window_start = now - MIRROR_PAST_DAYS * 86400
+        window_end = now + MIRROR_FUTURE_DAYS * 86400
+        items, sync_token = self._list(service, http, calendarId=calendar_id, singleEvents=True,
+                                       timeMin=_rfc3339(window_start), timeMax=_rfc3339(window_end))
+        rows = [row for row in (_event_row(calendar_id, item) for item in items) if row]
+
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM events WHERE calendar_id=?", (calendar_id,))
+            self._conn.executemany("INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO calendars VALUES (?, ?, ?, ?, ?, ?, ?, NULL)",
+                (calendar_id, sync_token, window_start, window_end, now, now, now),
+            )
+            self._prune(now)
+        print(f"📅 Mirrored {len(rows)} events of {calendar_id}.")
+
+    def _incremental_sync(self, service, calendar_id, sync_token, http):
+        items, sync_token = self._list(service, http, calendarId=calendar_id, singleEvents=True,
+                                       syncToken=sync_token)
+        now = time.time()
+        with self._lock, self._conn:
+            for item in items:
+                row = _event_row(calendar_id, item)
+                if row:
+                    self._conn.execute("INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?)", row)
+                else:
+                    self._conn.execute(
+                        "DELETE FROM events WHERE calendar_id=? AND event_id=?", (calendar_id, item["id"])
+                    )
+            self._conn.execute(
+                "UPDATE calendars SET sync_token=?, synced_at=?, changed_at=CASE WHEN ? THEN ? ELSE changed_at END "
+                "WHERE calendar_id=?",
+                (sync_token, now, bool(items), now, calendar_id),
+            )
+
+    @staticmethod
+    def _list(service, http, **params):
+        """Every page of one events.list request: (items, nextSyncToken)."""
+        items, page_token = [], None
+        while True:
+            result = service.events().list(
+                maxResults=2500, pageToken=page_token, fields=EVENT_FIELDS, **params
+            ).execute(http=http)
+            items.extend(result.get("items", []))
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                return items, result.get("nextSyncToken")
+
+    def _prune(self, now):
+        """Drops events that left the past window and mirrors nobody has read for IDLE_DAYS."""
+        self._conn.execute("DELETE FROM events WHERE end_ts < ?", (now - MIRROR_PAST_DAYS * 86400,))
+        idle = [r[0] for r in self._conn.execute(
+            "SELECT calendar_id FROM calendars WHERE last_access < ?", (now - IDLE_DAYS * 86400,)
+        )]
+        for calendar_id in idle:
+            self._conn.execute("DELETE FROM events WHERE calendar_id=?", (calendar_id,))
+            self._conn.execute("DELETE FROM calendars WHERE calendar_id=?", (calendar_id,))
+
+    def _set_error(self, calendar_id, error):
+        """Records a failed sync. The last good events stay until a successful full sync replaces them."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO calendars VALUES (?, NULL, 0, 0, ?, ?, ?, ?)
+                ON CONFLICT (calendar_id) DO UPDATE SET synced_at=excluded.synced_at, error=excluded.error
+                """,
+                (calendar_id, now, now, now, error),
+            )
+
+    def _state(self, calendar_id):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT * FROM calendars WHERE calendar_id=?", (calendar_id,)
+            ).fetchone()
+
+    # ------------------------
+    # Queries
+    # ------------------------
+    def error(self, calendar_id):
+        """Why the last sync of `calendar_id` failed, or None."""
+        state = self._state(calendar_id)
+        return state["error"] if state else None
+
+    def has_events(self, calendar_id):
+        """True when `calendar_id` was mirrored at least once, even if its latest sync failed."""
+        state = self._state(calendar_id)
+        return bool(state and state["window_end"])
+
+    def has_mirror(self, calendar_id):
+        state = self._state(calendar_id)
+        return bool(state and state["sync_token"] and not state["error"])
+
+    def covers(self, calendar_id, start, end):
+        """True when the mirror of `calendar_id` is readable and spans [start, end) (naive UTC)."""
+        state = self._state(calendar_id)
+        return bool(state and not state["error"]
+                    and state["window_start"] <= _ts(start) and _ts(end) <= state["window_end"])
+
+    def changed_since(self, calendar_id, ts):
+        """True when a sync after epoch `ts` found changes on `calendar_id` (or it is not mirrored)."""
+        state = self._state(calendar_id)
+        return state is None or bool(state["error"]) or state["changed_at"] > ts
+
+    def events(self, calendar_id, start, end):
+        """
+        Mirrored events of `calendar_id` overlapping [start, end) (naive UTC), oldest first,
+        in the shape of Calendar API items (id, status, start, end, transparency, attendees).
+        """
+        rows = self._query(calendar_id, start, end)
+        return [_row_to_event(row) for row in rows]
+
+    def busy_intervals(self, calendar_id, start, end):
+        """(start, end) naive UTC intervals in which `calendar_id` is busy, like freebusy reports them."""
+        rows = self._query(calendar_id, start, end)
+        return [
+            (_dt(row["start_ts"]), _dt(row["end_ts"]))
+            for row in rows if not row["transparent"] and not row["declined"]
+        ]
+
+    def _query(self, calendar_id, start, end):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE calendars SET last_access=? WHERE calendar_id=?", (time.time(), calendar_id))
+            return self._conn.execute(
+                "SELECT * FROM events WHERE calendar_id=? AND start_ts < ? AND end_ts > ? ORDER BY start_ts",
+                (calendar_id, _ts(end), _ts(start)),
+            ).fetchall()
+
+
+def _event_row(calendar_id, item):
+    """Row for a Calendar API item, or None for cancelled / unusable items."""
+    if item.get("status") == "cancelled":
+        return None
+    try:
+        all_day = "dateTime" not in item["start"]
+        if all_day:
+            start = datetime.datetime.fromisoformat(item["start"]["date"])
+            end = datetime.datetime.fromisoformat(item["end"]["date"])
+        else:
+            start = parse_api_time(item["start"]["dateTime"])
+            end = parse_api_time(item["end"]["dateTime"])
+    except (KeyError, ValueError):
+        return None
+    attendees = [
+        a["email"] for a in item.get("attendees", [])
+        if a.get("email") and not a.get("resource")
+    ]
+    declined = any(a.get("self") and a.get("responseStatus") == "declined" for a in item.get("attendees", []))
+    return (
+        calendar_id, item["id"], _ts(start), _ts(end), int(all_day),
+        int(item.get("transparency") == "transparent"), int(declined), json.dumps(attendees),
+    )
+
+
+def _row_to_event(row):
+    if row["all_day"]:
+        start = {"date": _dt(row["start_ts"]).date().isoformat()}
+        end = {"date": _dt(row["end_ts"]).date().isoformat()}
+    else:
+        start = {"dateTime": _dt(row["start_ts"]).isoformat() + "Z"}
+        end = {"dateTime": _dt(row["end_ts"]).isoformat() + "Z"}
+    return {
+        "id": row["event_id"],
+        "status": "confirmed",
+        "start": start,
+        "end": end,
+        "transparency": "transparent" if row["transparent"] else "opaque",
+        "attendees": [{"email": email} for email in json.loads(row["attendees"])],
+    }
+
+
+def _ts(dt):
+    """Epoch seconds of a naive UTC datetime."""
+    return dt.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+def _dt(ts):
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).replace(tzinfo=None)
+
+
+def _rfc3339(ts):
+    return _dt(ts).isoformat() + "Z"
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_event_store():
+    """EventStore of the signed-in user, or the process-wide one in single-user mode."""
+    return scoped(
+        "events",
+        lambda session: EventStore(session.path("events.db"), USER_SQLITE_CACHE_KIB),
+        _shared_store,
+    )
+
+
+def _shared_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = EventStore()
+    return _store
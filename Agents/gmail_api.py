@@ -0,0 +1,281 @@
+import os
+import json
+import requests
+from concurrent.futures import ThreadPoolExecutor
+
+from Agents import http_client
+from Agents.instrumentation import bind
+
+# Gmail REST endpoints; OPSPILOT_GOOGLE_API_ROOT points every Google API at another host (e.g. bench/)
+GMAIL_ROOT = os.getenv("OPSPILOT_GOOGLE_API_ROOT", "https://gmail.googleapis.com").rstrip("/")
+GMAIL_API_URL = f"{GMAIL_ROOT}/gmail/v1/users/me"
+GMAIL_BATCH_URL = f"{GMAIL_ROOT}/batch/gmail/v1"
+
+# Only the headers the UI actually parses
+METADATA_HEADERS = ["Subject", "From", "Date"]
+
+# Body tier: only the MIME tree and inline part data are requested, never attachment data
+BODY_FIELDS = "id,payload(mimeType,filename,body(data,attachmentId),parts(mimeType,filename,body(data,attachmentId),parts(mimeType,filename,body(data,attachmentId),parts(mimeType,filename,body(data,attachmentId)))))"
+MAX_BODY_RESPONSE_BYTES = 2 * 1024 * 1024
+
+LIST_PAGE_SIZE = 500      # Gmail's maximum for messages.list
+BATCH_SIZE = 50           # Gmail throttles batches larger than ~50 calls
+MAX_PARALLEL_BATCHES = 4
+
+HISTORY_TYPES = ["messageAdded", "messageDeleted", "labelAdded", "labelRemoved"]
+
+
+class HistoryExpiredError(Exception):
+    """Raised when a startHistoryId is too old for users.history.list and a full sync is needed."""
+
+
+def list_message_ids(token, query="is:unread", max_results=50):
+    """
+    Lists up to `max_results` message IDs matching `query`, following `nextPageToken`.
+    """
+    headers = {"Authorization": f"Bearer {token}"}
+    ids = []
+    page_token = None
+
+    while len(ids) < max_results:
+        params = {"q": query, "maxResults": min(LIST_PAGE_SIZE, max_results - len(ids))}
+        if page_token:
+            params["pageToken"] = page_token
+
+        resp = http_client.get(f"{GMAIL_API_URL}/messages", "gmail", headers=headers, params=params)
+        resp.raise_for_status()
+        data = resp.json()
+
+        ids.extend(m["id"] for m in data.get("messages", []))
+        page_token = data.get("nextPageToken")
+        if not page_token:
+            break
+
+    return ids[:max_results]
+
+
+def get_profile(token):
+    """Returns the mailbox profile, including the current `historyId`."""
+    resp = http_client.get(f"{GMAIL_API_URL}/profile", "gmail", headers={"Authorization": f"Bearer {token}"})
+    resp.raise_for_status()
+    return resp.json()
+
+
+def get_label(token, label_id):
+    """Returns label statistics such as `messagesUnread` for `label_id`."""
+    resp = http_client.get(
+        f"{GMAIL_API_URL}/labels/{label_id}", "gmail", headers={"Authorization": f"Bearer {token}"}
+    )
+    resp.raise_for_status()
+    return resp.json()
+
+
+def list_history(token, start_history_id):
+    """
+    Returns (history_records, latest_history_id) for every change since `start_history_id`.
+    Raises HistoryExpiredError when Gmail no longer has history that far back.
+    """
+    headers = {"Authorization": f"Bearer {token}"}
+    records = []
+    latest = start_history_id
+    page_token = None
+
+    while True:
+        params = {
+            "startHistoryId": start_history_id,
+            "historyTypes": HISTORY_TYPES,
+            "maxResults": LIST_PAGE_SIZE,
+        }
+        if page_token:
+            params["pageToken"] = page_token
+
+        resp = http_client.get(f"{GMAIL_API_URL}/history", "gmail", headers=headers, params=params)
+        if resp.status_code == 404:
+            raise HistoryExpiredError(f"History {start_history_id} is no longer available")
+        resp.raise_for_status()
+        data = resp.json()
+
+        records.extend(data.get("history", []))
+        latest = data.get("historyId", latest)
+        page_token = data.get("nextPageToken")
+        if not page_token:
+            break
+
+    return records, latest
+
+
+def send_raw_message(token, raw):
+    """
+    Sends a base64url-encoded RFC 2822 message. Never retried here: a send that timed
+    out may still have been delivered, so retry policy belongs to the caller.
+    """
+    resp = http_client.post(
+        f"{GMAIL_API_URL}/messages/send",
+        "gmail",
+        retries=0,
+        headers={"Authorization": f"Bearer {token}"},
+        json={"raw": raw},
+    )
+    resp.raise_for_status()
+    return resp.json()
+
+
+def get_message_metadata(token, msg_id):
+    """Fetches a single message in `format=metadata`."""
+    resp = http_client.get(
+        f"{GMAIL_API_URL}/messages/{msg_id}",
+        "gmail",
+        headers={"Authorization": f"Bearer {token}"},
+        params={"format": "metadata", "metadataHeaders": METADATA_HEADERS},
+    )
+    resp.raise_for_status()
+    return resp.json()
+
+
+def get_message_payload(token, msg_id, max_bytes=MAX_BODY_RESPONSE_BYTES):
+    """
+    Fetches the MIME tree of a message (`format=full`, trimmed to BODY_FIELDS) for body decoding.
+    The response is streamed and abandoned past `max_bytes`, in which case None is returned.
+    """
+    resp = http_client.get(
+        f"{GMAIL_API_URL}/messages/{msg_id}",
+        "gmail",
+        headers={"Authorization": f"Bearer {token}"},
+        params={"format": "full", "fields": BODY_FIELDS},
+        stream=True,
+    )
+    try:
+        resp.raise_for_status()
+        content = bytearray()
+        for chunk in resp.iter_content(chunk_size=64 * 1024):
+            content.extend(chunk)
+            if len(content) > max_bytes:
+                return None
+        return json.loads(bytes(content)).get("payload", {})
+    finally:
+        resp.close()
+
+
+def _metadata_path(msg_id):
+    headers = "&".join(f"metadataHeaders={h}" for h in METADATA_HEADERS)
+    return f"/gmail/v1/users/me/messages/{msg_id}?format=metadata&{headers}"
+
+
+def _build_batch_body(msg_ids, boundary):
+    parts = []
+    for i, msg_id in enumerate(msg_ids):
+        parts.append(
+            f"--{boundary}\r\n"
+            f"Content-Type: application/http\r\n"
+            f"Content-ID: <item{i}>\r\n\r\n"
+            f"GET {_metadata_path(msg_id)}\r\n\r\n"
+        )
+    parts.append(f"--{boundary}--")
+    return "".join(parts)
+
+
+def _parse_batch_response(content_type, text):
+    """
+    Splits a multipart/mixed batch response into (status, json_body) tuples.
+    """
+    boundary = None
+    for param in content_type.split(";"):
+        key, _, value = param.strip().partition("=")
+        if key.lower() == "boundary":
+            boundary = value.strip('"')
+    if not boundary:
+        raise ValueError("Batch response has no multipart boundary")
+
+    results = []
+    for part in text.split(f"--{boundary}"):
+        part = part.strip()
+        if not part or part == "--":
+            continue
+
+        # Each part wraps a full HTTP response: outer headers, status line, headers, body
+        status_at = part.find("HTTP/")
+        if status_at == -1:
+            continue
+        http_response = part[status_at:]
+        status_line, _, rest = http_response.partition("\n")
+        try:
+            status = int(status_line.split()[1])
+        except (IndexError, ValueError):
+            continue
+
+        body_at = rest.find("{")
+        body = {}
+        if body_at != -1:
+            try:
+                body = json.loads(rest[body_at:rest.rfind("}") + 1])
+            except ValueError:
+                body = {}
+        results.append((status, body))
+    return results
+
+
+def _fetch_batch(token, msg_ids):
+    boundary = "opspilot_batch"
+    fetched = {}
+    try:
+        resp = http_client.post(
+            GMAIL_BATCH_URL,
+            "gmail",
+            headers={
+                "Authorization": f"Bearer {token}",
+                "Content-Type": f"multipart/mixed; boundary={boundary}",
+            },
+            data=_build_batch_body(msg_ids, boundary),
+        )
+        resp.raise_for_status()
+        for status, body in _parse_batch_response(resp.headers.get("Content-Type", ""), resp.text):
+            if status == 200 and body.get("id"):
+                fetched[body["id"]] = body
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print(f"⚠️ Batch request failed, fetching {len(msg_ids)} messages individually: {e}")
+
+    # Parts that failed inside the batch (usually per-user rate limits) are retried one by one
+    for msg_id in msg_ids:
+        if msg_id in fetched:
+            continue
+        try:
+            fetched[msg_id] = get_message_metadata(token, msg_id)
+        except requests.exceptions.RequestException as e:
+            print(f"⚠️ Failed to fetch message {msg_id}: {e}")
+    return fetched
+
+
+def batch_get_metadata(token, msg_ids):
+    """
+    Fetches metadata for many messages using Gmail's multipart batch endpoint.
+    Batches of BATCH_SIZE run concurrently over the pooled session.
+    Returns messages in the same order as `msg_ids`, skipping any that failed.
+    """
+    if not msg_ids:
+        return []
+
+    chunks = [msg_ids[i:i + BATCH_SIZE] for i in range(0, len(msg_ids), BATCH_SIZE)]
+    fetched = {}
+    with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_BATCHES, len(chunks))) as pool:
+        for result in pool.map(bind(lambda chunk: _fetch_batch(token, chunk)), chunks):
+            fetched.update(result)
+
+    return [fetched[msg_id] for msg_id in msg_ids if msg_id in fetched]
+
+
+def parse_message_metadata(msg_detail):
+    """Turns a `format=metadata` message into the dict shape the UI uses."""
+    headers_list = msg_detail.get("payload", {}).get("headers", [])
+
+    subject = next((h["value"] for h in headers_list if h["name"] == "Subject"), "No Subject")
+    sender = next((h["value"] for h in headers_list if h["name"] == "From"), "Unknown Sender")
+    date = next((h["value"] for h in headers_list if h["name"] == "Date"), "")
+
+    return {
+        "id": msg_detail.get("id"),
+        "subject": subject,
+        "sender": sender,
+        "body": msg_detail.get("snippet", ""),
+        "date": date,
+        "timestamp": int(msg_detail.get("internalDate", 0)),
+    }
@@ -0,0 +1,176 @@
+import time
+import random
+import datetime
+import threading
+import email.utils
+import requests
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+
+from Agents.instrumentation import registry, operation_name
+
+# (connect, read) seconds; Groq completions can legitimately take a while to generate
+TIMEOUTS = {
+    "gmail": (5, 30),
+    "groq": (5, 60),
+}
+DEFAULT_TIMEOUT = (5, 30)
+
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+POOL_SIZE = 16
+FAILURE_THRESHOLD = 5     # consecutive failures before the circuit opens
+RESET_TIMEOUT = 30        # seconds before a half-open trial request is allowed
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of calling an upstream whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for `reset_timeout`
+    seconds, then lets a single trial call through (half-open) to decide whether to close again.
+    """
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+
+_lock = threading.Lock()
+_sessions = {}
+_breakers = {}
+
+
+def get_session(upstream):
+    """Keep-alive session for `upstream`, shared by every agent in the process."""
+    with _lock:
+        if upstream not in _sessions:
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE))
+            session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE))
+            _sessions[upstream] = session
+        return _sessions[upstream]
+
+
+def get_breaker(upstream):
+    with _lock:
+        if upstream not in _breakers:
+            _breakers[upstream] = CircuitBreaker()
+        return _breakers[upstream]
+
+
+def retry_delay(response, attempt):
+    """Seconds to wait before retry `attempt`: the upstream's Retry-After, else full-jitter backoff."""
+    header = response.headers.get("Retry-After") if response is not None else None
+    if header:
+        try:
+            return min(BACKOFF_CAP, max(0.0, float(header)))
+        except ValueError:
+            pass
+        # An HTTP date otherwise; a malformed header falls back to backoff instead of failing the call
+        try:
+            parsed = email.utils.parsedate_to_datetime(header)
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+            return min(BACKOFF_CAP, max(0.0, parsed.timestamp() - time.time()))
+        except (TypeError, ValueError):
+            pass
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def request(method, url, upstream, retries=MAX_RETRIES, timeout=None, **kwargs):
+    """
+    Sends a request through the pooled session for `upstream`.
+    Connection errors, timeouts, 429 and 5xx responses are retried with jittered exponential
+    backoff (honoring Retry-After). Returns the final response; callers still call
+    `raise_for_status()`. Raises CircuitOpenError while the upstream is considered down.
+    Every call is timed and counted in the instrumentation registry.
+    """
+    session = get_session(upstream)
+    breaker = get_breaker(upstream)
+    timeout = timeout or TIMEOUTS.get(upstream, DEFAULT_TIMEOUT)
+
+    started = time.perf_counter()
+    attempt, ok = 0, False
+    try:
+        for attempt in range(retries + 1):
+            if not breaker.allow():
+                raise CircuitOpenError(f"{upstream} circuit is open; failing fast")
+
+            try:
+                response = session.request(method, url, timeout=timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                breaker.record_failure()
+                if attempt == retries:
+                    raise
+                delay = retry_delay(None, attempt)
+                print(f"⚠️ {upstream} request failed ({e}); retrying in {delay:.1f}s...")
+                time.sleep(delay)
+                continue
+
+            # Rate limiting means the upstream is alive; only server errors trip the breaker
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+
+            if response.status_code in RETRY_STATUSES and attempt < retries:
+                delay = retry_delay(response, attempt)
+                print(f"⏳ {upstream} returned {response.status_code}; retrying in {delay:.1f}s...")
+                response.close()
+                time.sleep(delay)
+                continue
+            ok = response.status_code < 400
+            return response
+    finally:
+        # One record per logical call: total time including backoff, plus how many retries it took
+        operation = f"{method} {operation_name(urlsplit(url).path)}"
+        registry.record_call(upstream, operation, time.perf_counter() - started, ok, retries=attempt)
+
+
+def get(url, upstream, **kwargs):
+    return request("GET", url, upstream, **kwargs)
+
+
+def post(url, upstream, **kwargs):
+    return request("POST", url, upstream, **kwargs)
@@ -1,146 +1,342 @@
 import os
-import pickle
-import requests
+import time
 import streamlit as st
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
+from Agents.gmail_api import (
+    list_message_ids,
+    batch_get_metadata,
+    parse_message_metadata,
+    get_profile,
+    get_label,
+    list_history,
+    get_message_payload,
+    HistoryExpiredError,
+    MAX_PARALLEL_BATCHES,
+)
+from Agents.message_body import extract_body
+from Agents.mail_search import parse_query, UnsupportedQueryError
+from Agents.message_store import MailboxMirror, get_message_store
+from Agents.credentials import get_credential_provider
+from Agents.instrumentation import agent, bind, registry
+
 # Load environment variables
 load_dotenv()
 
-# Define the scopes for Google API access
-SCOPES = [
-    "https://www.googleapis.com/auth/calendar",
-    "https://www.googleapis.com/auth/calendar.events",
-    "https://www.googleapis.com/auth/calendar.readonly",
-    "https://www.googleapis.com/auth/calendar.freebusy",
-    "https://www.googleapis.com/auth/gmail.readonly",
-    "https://www.googleapis.com/auth/gmail.send",
-    "https://www.googleapis.com/auth/gmail.modify",
-    "https://www.googleapis.com/auth/userinfo.email",
-    "https://www.googleapis.com/auth/userinfo.profile",
-    "openid"
-]
+# Inbox list paging; the page size can also be changed in the UI
+INBOX_PAGE_SIZE = int(os.getenv("OPSPILOT_INBOX_PAGE_SIZE", "25"))
+PAGE_SIZES = sorted({10, 25, 50, 100, INBOX_PAGE_SIZE})
 
+# Unread messages the Inbox page keeps synced; prewarm fills the same mirror
+INBOX_SYNC_SIZE = int(os.getenv("OPSPILOT_INBOX_SYNC_SIZE", "50"))
 
+# Most messages a local search returns
+SEARCH_LIMIT = 500
 
-class InboxAgent:
-    def __init__(self):
-        self.creds = None
+# Queries that map onto a single Gmail label can be kept in sync through users.history.list
+QUERY_LABELS = {
+    "is:unread": "UNREAD",
+    "in:inbox": "INBOX",
+    "is:starred": "STARRED",
+    "is:important": "IMPORTANT",
+}
 
-        # Load or refresh credentials
-        if os.path.exists("token.pkl"):
-            with open("token.pkl", "rb") as token_file:
-                self.creds = pickle.load(token_file)
 
-        if not self.creds or not self.creds.valid:
-            if self.creds and self.creds.expired and self.creds.refresh_token:
-                self.creds.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    "credentials.json", SCOPES
-                )
-                self.creds = flow.run_local_server(port=0)
+@agent("inbox")
+class InboxAgent:
+    def __init__(self, store=None, credentials=None):
+        self.credentials = credentials or get_credential_provider()
+        self.store = store or get_message_store()
 
-            with open("token.pkl", "wb") as token_file:
-                pickle.dump(self.creds, token_file)
+    @property
+    def creds(self):
+        return self.credentials.credentials
+
+    @property
+    def token(self):
+        """Current access token, kept fresh by the shared credential provider."""
+        return self.credentials.token()
 
     def fetch_all_emails(self, query="is:unread", max_results=50):
         """
-        Fetches up to `max_results` emails matching `query` via Gmail REST API using requests.
-        Returns a list of dicts with keys: subject, sender, body, date.
+        Fetches up to `max_results` emails matching `query` via the Gmail REST API.
+        IDs are paged through `messages.list`; metadata (Subject/From/Date + snippet) is read
+        from the message store, and only messages missing there are pulled with batched
+        requests over a pooled session.
+        Returns a list of dicts with keys: id, subject, sender, body, date.
+        """
+        msg_ids = list_message_ids(self.token, query=query, max_results=max_results)
+        return self._load_messages(msg_ids)
+
+    def search(self, query, max_results=SEARCH_LIMIT):
+        """
+        Messages matching Gmail-style `query`, newest first, answered from the local full-text
+        index over synced mail. Queries using operators the index cannot answer go to Gmail instead.
+        """
+        # Only mailboxes with a synced mirror can be answered locally; "not unread" needs all of them
+        mirrors = {q: complete for q, complete in self.store.mirrored_mailboxes().items() if q in QUERY_LABELS}
+        try:
+            parsed = parse_query(query, mailboxes=mirrors,
+                                 complete_mailboxes=[q for q, complete in mirrors.items() if complete])
+        except UnsupportedQueryError as e:
+            print(f"⚠️ {e}; searching Gmail instead.")
+            return self.fetch_all_emails(query=query, max_results=max_results)
+        return self.store.search(parsed, limit=max_results)
+
+    def load_for_report(self, emails):
+        """
+        Returns `emails` as the report summarizes them: the stored copy of each message with
+        its body tier loaded on demand, falling back to the snippet when no text could be decoded.
+        """
+        stored = self.load_bodies([e["id"] for e in emails if e.get("id")])
+        loaded = []
+        for email in emails:
+            email = stored.get(email.get("id"), email)
+            loaded.append({**email, "body": email.get("full_body") or email["body"]})
+        return loaded
+
+    def load_bodies(self, msg_ids):
         """
-        token = self.creds.token
-        headers = {"Authorization": f"Bearer {token}"}
-        base_url = "https://gmail.googleapis.com/gmail/v1/users/me/messages"
-
-        # 1) List message IDs
-        params = {"maxResults": max_results, "q": query}
-        resp = requests.get(base_url, headers=headers, params=params)
-        resp.raise_for_status()
-        messages = resp.json().get("messages", [])
-
-        emails = []
-        for msg in messages:
-            msg_id = msg.get("id")
+        Returns {id: email} from the store with `full_body` filled in. Bodies not stored yet
+        are fetched concurrently, decoded under the size cap and saved with the message.
+        """
+        stored = self.store.get_many(msg_ids)
+        missing = [msg_id for msg_id, email in stored.items() if email["full_body"] is None]
+        registry.record_cache("bodies", True, len(stored) - len(missing))
+        registry.record_cache("bodies", False, len(missing))
+        if not missing:
+            return stored
+
+        token = self.token
+        with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_BATCHES, len(missing))) as pool:
+            bodies = pool.map(bind(lambda msg_id: self._fetch_body(token, msg_id)), missing)
+            for msg_id, body in zip(missing, bodies):
+                if body is not None:
+                    self.store.set_body(msg_id, body)
+                    stored[msg_id]["full_body"] = body
+        return stored
+
+    def _fetch_body(self, token, msg_id):
+        try:
+            payload = get_message_payload(token, msg_id)
+        except Exception as e:
+            print(f"⚠️ Could not load body of {msg_id}: {e}")
+            return None
+        # An oversized message keeps an empty body tier, so the report falls back to its snippet
+        return extract_body(payload) if payload is not None else ""
+
+    def _load_messages(self, msg_ids):
+        """Returns emails for `msg_ids` from the store, fetching and storing any that are missing."""
+        stored = self.store.get_many(msg_ids)
+        missing = [msg_id for msg_id in msg_ids if msg_id not in stored]
+        registry.record_cache("messages", True, len(stored))
+        registry.record_cache("messages", False, len(missing))
+        if missing:
+            fetched = [parse_message_metadata(m) for m in batch_get_metadata(self.token, missing)]
+            self.store.put_many(fetched)
+            stored.update((e["id"], e) for e in fetched)
+        return [stored[msg_id] for msg_id in msg_ids if msg_id in stored]
+
+    def sync_emails(self, query="is:unread", max_results=50, refresh=False):
+        """
+        Returns emails matching `query` from the local mailbox mirror.
+        With `refresh=True` the mirror is brought up to date through users.history.list,
+        falling back to a full fetch only when the stored historyId has expired.
+        Queries that are not backed by a single label are always fetched in full.
+        """
+        if query not in QUERY_LABELS:
+            return self.fetch_all_emails(query=query, max_results=max_results)
+
+        mirror = self.store.load_mirror(query, max_results)
+        if mirror is None or mirror.history_id is None:
+            mirror = self._full_sync(query, max_results)
+        elif refresh:
             try:
-                # 2) Get full message
-                get_url = f"{base_url}/{msg_id}"
-                r2 = requests.get(get_url, headers=headers)
-                r2.raise_for_status()
-                msg_detail = r2.json()
-
-                payload = msg_detail.get("payload", {})
-                headers_list = payload.get("headers", [])
-
-                subject = next((h["value"] for h in headers_list if h["name"] == "Subject"), "No Subject")
-                sender = next((h["value"] for h in headers_list if h["name"] == "From"), "Unknown Sender")
-                date = next((h["value"] for h in headers_list if h["name"] == "Date"), "")
-                snippet = msg_detail.get("snippet", "")
-
-                emails.append({
-                    "subject": subject,
-                    "sender": sender,
-                    "body": snippet,
-                    "date": date
-                })
-            except requests.exceptions.RequestException as e:
-                print(f"⚠️ Failed to fetch message {msg_id}: {e}")
-            except Exception as e:
-                print(f"⚠️ Unexpected error processing message {msg_id}: {e}")
-
-        return emails
+                self._incremental_sync(mirror)
+            except HistoryExpiredError as e:
+                print(f"⚠️ {e}; running a full sync.")
+                mirror = self._full_sync(query, max_results)
+
+            # A truncated mirror that lost messages may be missing older matches
+            if not mirror.complete and len(mirror.message_ids) < max_results:
+                mirror = self._full_sync(query, max_results)
+
+        emails = self._load_messages(list(mirror.message_ids))
+        emails.sort(key=lambda e: e.get("timestamp", 0), reverse=True)
+        return emails[:max_results]
+
+    def _full_sync(self, query, max_results):
+        token = self.token
+        mirror = MailboxMirror(query, max_results)
+
+        # Read historyId before listing so no change between the two calls is lost
+        mirror.history_id = get_profile(token).get("historyId")
+        msg_ids = list_message_ids(token, query=query, max_results=max_results)
+        mirror.complete = len(msg_ids) < max_results
+        mirror.message_ids = set(msg_ids)
+
+        self._load_messages(msg_ids)
+        self.store.save_mirror(mirror)
+        return mirror
+
+    def _incremental_sync(self, mirror):
+        label_id = QUERY_LABELS[mirror.query]
+        records, latest_history_id = list_history(self.token, mirror.history_id)
+
+        # Replay changes in order; only messages that end up carrying the label are kept
+        for record in records:
+            for item in record.get("messagesAdded", []):
+                msg = item.get("message", {})
+                if label_id in msg.get("labelIds", []):
+                    mirror.message_ids.add(msg["id"])
+            for item in record.get("labelsAdded", []):
+                if label_id in item.get("labelIds", []):
+                    mirror.message_ids.add(item["message"]["id"])
+            for item in record.get("labelsRemoved", []):
+                if label_id in item.get("labelIds", []):
+                    mirror.message_ids.discard(item["message"]["id"])
+            for item in record.get("messagesDeleted", []):
+                mirror.message_ids.discard(item["message"]["id"])
+
+        # Pull metadata for new members, then keep only the newest `max_results`
+        emails = self._load_messages(list(mirror.message_ids))
+        if len(emails) > mirror.max_results:
+            emails.sort(key=lambda e: e.get("timestamp", 0), reverse=True)
+            mirror.message_ids = {e["id"] for e in emails[:mirror.max_results]}
+            mirror.complete = False
+
+        mirror.history_id = latest_history_id
+        self.store.save_mirror(mirror)
+        print(f"🔄 Synced {len(records)} history records into the local mailbox.")
+
+    def unread_count(self):
+        """Total unread messages, read from the UNREAD label statistics in one call."""
+        return get_label(self.token, "UNREAD").get("messagesUnread", 0)
 
     def fetch_emails(self, max_results=5):
         """Fetch the latest unread emails (default wrapper)."""
         return self.fetch_all_emails(query="is:unread", max_results=max_results)
 
-@st.cache_data(show_spinner=False)
-def load_emails(_inbox, max_results=50):
-    return _inbox.fetch_all_emails(query="is:unread", max_results=max_results)
+def load_emails(inbox, max_results=INBOX_SYNC_SIZE, refresh=False):
+    return inbox.sync_emails(query="is:unread", max_results=max_results, refresh=refresh)
 
 
 def display_inbox_ui(inbox):
     st.header("📥 Unread Emails")
 
-    if st.button("🔄 Refresh"):
-        load_emails.clear()
-    
-    emails = load_emails(inbox)
+    refresh = st.button("🔄 Refresh")
+    emails = synced = load_emails(inbox, refresh=refresh)
+    search = st.text_input("🔎 Search synced mail", placeholder='from:alice subject:"release" newer_than:7d',
+                           help="Gmail search syntax: from:, subject:, is:unread, is:read, after:, before:, "
+                                "newer_than:, older_than:, -term and free text.")
+    if search:
+        started = time.perf_counter()
+        emails = inbox.search(search)
+        st.caption(f"🔎 {len(emails)} match(es) in {(time.perf_counter() - started) * 1000:.0f} ms")
     st.session_state.emails = emails
 
+    # Selection is keyed by Gmail message id, so it survives refreshes that reorder the list.
+    # Messages found by search stay selectable; anything else that left the mailbox is dropped.
+    _init_selection()
+    shown = {email["id"]: email for email in emails} if search else {}
+    found = {**st.session_state.found_emails, **shown}
+    st.session_state.email_index = {**{email["id"]: email for email in synced}, **found}
+    selected = st.session_state.selected_email_ids
+    selected &= set(st.session_state.email_index)
+    st.session_state.found_emails = {m: e for m, e in found.items() if m in selected or m in shown}
+    _derive_selected_emails()
+
     if not emails:
-        st.info("No unread emails")
+        st.info("No emails match this search" if search else "No unread emails")
         return
 
-    # Create a dict in session state to track selection
-    if "selected_email_ids" not in st.session_state:
-        st.session_state.selected_email_ids = set()
-
     st.markdown("✅ **Select emails to include in the report:**")
+    _display_email_page(inbox, emails)
+
+
+@st.fragment
+def _display_email_page(inbox, emails):
+    """
+    Renders one page of `emails`. Runs as a fragment: ticking a box or changing page reruns
+    only this list, and its cost depends on the page size, not on the size of the inbox.
+    """
+    selected = st.session_state.selected_email_ids
+
+    c1, c2, c3, c4 = st.columns([1, 1, 1, 1])
+    page_size = c1.selectbox("Per page", PAGE_SIZES, index=PAGE_SIZES.index(INBOX_PAGE_SIZE), key="inbox_page_size")
+    pages = max(1, -(-len(emails) // page_size))
+    if st.session_state.get("inbox_page", 1) > pages:
+        st.session_state.inbox_page = pages
+    page = c2.number_input(f"Page (of {pages})", min_value=1, max_value=pages, step=1, key="inbox_page")
+    visible = emails[(page - 1) * page_size:page * page_size]
+
+    c3.button("☑️ Select page", on_click=_select, args=([email["id"] for email in visible],))
+    c4.button("✖️ Clear selection", on_click=_select, args=([],))
 
-    for idx, email in enumerate(emails):
-        with st.expander(f"📨 {email['subject']} — {email['sender']}"):
-            selected = st.checkbox(
-                "Include in report",
-                key=f"email_{idx}",
-                value=email.get("id") in st.session_state.selected_email_ids
-            )
+    version = st.session_state.selection_version
+    for email in visible:
+        tick, item = st.columns([0.05, 0.95])
+        tick.checkbox(
+            "Include in report",
+            key=f"email_{version}_{email['id']}",
+            value=email["id"] in selected,
+            label_visibility="collapsed",
+            on_change=_toggle,
+            args=(email["id"], f"email_{version}_{email['id']}"),
+        )
+        with item.expander(f"📨 {email['subject']} — {email['sender']}"):
             st.write(f"**From:** {email['sender']}")
             st.write(f"**Date:** {email['date']}")
-            st.write(email["body"])
-            st.markdown("---")
-
-            # Track selected email IDs
-            if selected:
-                st.session_state.selected_email_ids.add(idx)
+            # The body tier is only fetched for messages the user actually opens
+            if st.toggle("📄 Show full message", key=f"body_{email['id']}"):
+                with st.spinner("📩 Loading message..."):
+                    stored = inbox.load_bodies([email["id"]]).get(email["id"], email)
+                st.write(stored.get("full_body") or email["body"])
             else:
-                st.session_state.selected_email_ids.discard(idx)
+                st.write(email["body"])
+
+    _derive_selected_emails()
+    st.success(f"✅ {len(st.session_state.selected_emails)} email(s) selected for report.")
+
+
+def _init_selection():
+    st.session_state.setdefault("selected_email_ids", set())
+    st.session_state.setdefault("found_emails", {})
+    st.session_state.setdefault("email_index", {})
+    st.session_state.setdefault("selection_version", 0)
+
 
-    # Save selected emails to session state for ReportAgent
+def _derive_selected_emails():
+    """Saves the selected emails to session state for ReportAgent, in mailbox order."""
+    index = st.session_state.email_index
     st.session_state.selected_emails = [
-        emails[i] for i in st.session_state.selected_email_ids
+        email for msg_id, email in index.items() if msg_id in st.session_state.selected_email_ids
     ]
 
-    st.success(f"✅ {len(st.session_state.selected_emails)} email(s) selected for report.")
+
+def add_to_selection(emails):
+    """Selects `emails` (e.g. search results picked on the Report page) for the report."""
+    _init_selection()
+    for email in emails:
+        st.session_state.found_emails.setdefault(email["id"], email)
+        st.session_state.email_index.setdefault(email["id"], email)
+    _select([email["id"] for email in emails])
+    _derive_selected_emails()
+
+
+def _toggle(msg_id, key):
+    if st.session_state[key]:
+        st.session_state.selected_email_ids.add(msg_id)
+    else:
+        st.session_state.selected_email_ids.discard(msg_id)
+
+
+def _select(msg_ids):
+    """Selects `msg_ids` on top of the current selection, or clears it when empty."""
+    if msg_ids:
+        st.session_state.selected_email_ids.update(msg_ids)
+    else:
+        st.session_state.selected_email_ids.clear()
+    # New checkbox keys, so every box picks up its value from the selection again
+    st.session_state.selection_version += 1
@@ -0,0 +1,283 @@
+import re
+import json
+import time
+import bisect
+import inspect
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets; +Inf is implicit
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# agent / page tags of the code currently running; copied into worker threads by `bind`
+_tags = contextvars.ContextVar("opspilot_tags", default={})
+
+
+# ------------------------
+# Tagging
+# ------------------------
+def current_tags():
+    tags = _tags.get()
+    return {"agent": tags.get("agent", "other"), "page": tags.get("page", "none")}
+
+
+@contextmanager
+def tagged(**tags):
+    """Tags every call made inside the block, e.g. `with tagged(agent="outbox"):`."""
+    token = _tags.set({**_tags.get(), **tags})
+    try:
+        yield
+    finally:
+        _tags.reset(token)
+
+
+def set_page(page):
+    """Tags the rest of the current Streamlit run with `page`."""
+    _tags.set({**_tags.get(), "page": page})
+
+
+def bind(fn):
+    """Wraps `fn` so it runs with the caller's tags, for work handed to thread pools."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+
+def agent(name):
+    """
+    Class or function decorator: calls made by the decorated code are tagged with agent `name`.
+    On a class, __init__ and every public method are wrapped.
+    """
+    def wrap(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def run_async(*args, **kwargs):
+                with tagged(agent=name):
+                    return await fn(*args, **kwargs)
+            return run_async
+
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            with tagged(agent=name):
+                return fn(*args, **kwargs)
+        return run
+
+    def decorate(target):
+        if not inspect.isclass(target):
+            return wrap(target)
+        for attr, value in list(vars(target).items()):
+            if (attr == "__init__" or not attr.startswith("_")) and inspect.isfunction(value):
+                setattr(target, attr, wrap(value))
+        return target
+
+    return decorate
+
+
+# ------------------------
+# Registry
+# ------------------------
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimates the q-quantile by linear interpolation inside its bucket, like Prometheus."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                lower = LATENCY_BUCKETS[i - 1] if i else 0.0
+                upper = LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else LATENCY_BUCKETS[-1]
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return LATENCY_BUCKETS[-1]
+
+
+class Registry:
+    """
+    In-process metrics for external calls: latency histograms, call, error and retry counts,
+    cache hits and LLM token usage. Every series is labelled with agent and page.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.time()
+            self.latency = {}     # (api, operation, agent, page) -> Histogram
+            self.calls = {}       # (api, operation, agent, page, outcome) -> count
+            self.retries = {}     # (api, operation, agent, page) -> count
+            self.cache = {}       # (cache, result, agent, page) -> count
+            self.tokens = {}      # (model, kind, agent, page) -> count
+
+    def record_call(self, api, operation, seconds, ok, retries=0):
+        tags = current_tags()
+        key = (api, operation, tags["agent"], tags["page"])
+        with self._lock:
+            self.latency.setdefault(key, Histogram()).observe(seconds)
+            outcome = key + ("ok" if ok else "error",)
+            self.calls[outcome] = self.calls.get(outcome, 0) + 1
+            if retries:
+                self.retries[key] = self.retries.get(key, 0) + retries
+
+    def record_cache(self, cache, hit, amount=1):
+        if amount <= 0:
+            return
+        tags = current_tags()
+        key = (cache, "hit" if hit else "miss", tags["agent"], tags["page"])
+        with self._lock:
+            self.cache[key] = self.cache.get(key, 0) + amount
+
+    def record_usage(self, model, usage):
+        """Adds the `usage` block of a chat completion (prompt / completion tokens)."""
+        if not usage:
+            return
+        tags = current_tags()
+        with self._lock:
+            for kind in ("prompt_tokens", "completion_tokens"):
+                key = (model or "unknown", kind.split("_")[0], tags["agent"], tags["page"])
+                self.tokens[key] = self.tokens.get(key, 0) + int(usage.get(kind) or 0)
+
+    # ------------------------
+    # Export
+    # ------------------------
+    def snapshot(self):
+        """Plain-dict view of every series, suitable for JSON export and tables."""
+        with self._lock:
+            calls = []
+            for key, hist in self.latency.items():
+                api, operation, agent_name, page = key
+                calls.append({
+                    "api": api,
+                    "operation": operation,
+                    "agent": agent_name,
+                    "page": page,
+                    "calls": hist.count,
+                    "errors": self.calls.get(key + ("error",), 0),
+                    "retries": self.retries.get(key, 0),
+                    "avg_ms": round(hist.sum / hist.count * 1000, 1),
+                    "p50_ms": round(hist.quantile(0.5) * 1000, 1),
+                    "p95_ms": round(hist.quantile(0.95) * 1000, 1),
+                    "buckets": dict(zip([str(b) for b in LATENCY_BUCKETS] + ["+Inf"], hist.counts)),
+                })
+            caches = {}
+            for (cache, result, agent_name, page), n in self.cache.items():
+                row = caches.setdefault((cache, agent_name, page),
+                                        {"cache": cache, "agent": agent_name, "page": page, "hits": 0, "misses": 0})
+                row["hits" if result == "hit" else "misses"] += n
+            tokens = {}
+            for (model, kind, agent_name, page), n in self.tokens.items():
+                row = tokens.setdefault((model, agent_name, page),
+                                        {"model": model, "agent": agent_name, "page": page, "prompt": 0, "completion": 0})
+                row[kind] += n
+            return {
+                "since": self.started_at,
+                "calls": sorted(calls, key=lambda c: -c["calls"]),
+                "caches": list(caches.values()),
+                "tokens": list(tokens.values()),
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        def labels(**values):
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in values.items()) + "}"
+
+        lines = [
+            "# HELP opspilot_api_call_seconds Latency of external API calls.",
+            "# TYPE opspilot_api_call_seconds histogram",
+        ]
+        with self._lock:
+            for (api, operation, agent_name, page), hist in sorted(self.latency.items()):
+                base = dict(api=api, operation=operation, agent=agent_name, page=page)
+                cumulative = 0
+                for bound, n in zip([str(b) for b in LATENCY_BUCKETS] + ["+Inf"], hist.counts):
+                    cumulative += n
+                    lines.append(f"opspilot_api_call_seconds_bucket{labels(**base, le=bound)} {cumulative}")
+                lines.append(f"opspilot_api_call_seconds_sum{labels(**base)} {hist.sum:.6f}")
+                lines.append(f"opspilot_api_call_seconds_count{labels(**base)} {hist.count}")
+
+            lines += ["# HELP opspilot_api_calls_total External API calls by outcome.",
+                      "# TYPE opspilot_api_calls_total counter"]
+            for (api, operation, agent_name, page, outcome), n in sorted(self.calls.items()):
+                lines.append(f"opspilot_api_calls_total"
+                             f"{labels(api=api, operation=operation, agent=agent_name, page=page, outcome=outcome)} {n}")
+
+            lines += ["# HELP opspilot_api_retries_total Retried attempts of external API calls.",
+                      "# TYPE opspilot_api_retries_total counter"]
+            for (api, operation, agent_name, page), n in sorted(self.retries.items()):
+                lines.append(f"opspilot_api_retries_total"
+                             f"{labels(api=api, operation=operation, agent=agent_name, page=page)} {n}")
+
+            lines += ["# HELP opspilot_cache_requests_total Cache lookups by result.",
+                      "# TYPE opspilot_cache_requests_total counter"]
+            for (cache, result, agent_name, page), n in sorted(self.cache.items()):
+                lines.append(f"opspilot_cache_requests_total"
+                             f"{labels(cache=cache, result=result, agent=agent_name, page=page)} {n}")
+
+            lines += ["# HELP opspilot_llm_tokens_total LLM tokens reported in completion usage.",
+                      "# TYPE opspilot_llm_tokens_total counter"]
+            for (model, kind, agent_name, page), n in sorted(self.tokens.items()):
+                lines.append(f"opspilot_llm_tokens_total"
+                             f"{labels(model=model, kind=kind, agent=agent_name, page=page)} {n}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+registry = Registry()
+
+
+def operation_name(path):
+    """Low-cardinality name for a REST path: ids (long or numeric segments with digits) become {id}."""
+    segments = [s for s in path.split("/") if s]
+    return "/".join("{id}" if _looks_like_id(s) else s for s in segments)
+
+
+def _looks_like_id(segment):
+    return bool(re.search(r"\d", segment)) and (len(segment) >= 8 or segment.isdigit())
+
+
+# ------------------------
+# Google API client transport
+# ------------------------
+class InstrumentedHttp:
+    """
+    Wraps the httplib2-style transport of a googleapiclient service so every request
+    (Calendar, OAuth2, Gmail via discovery) is timed and counted under `api`.
+    Other attributes, such as `credentials`, pass through to the wrapped object.
+    """
+
+    def __init__(self, http, api):
+        self.http = http
+        self.api = api
+
+    def request(self, uri, method="GET", *args, **kwargs):
+        started = time.perf_counter()
+        ok = False
+        try:
+            response, content = self.http.request(uri, method, *args, **kwargs)
+            ok = response.status < 400
+            return response, content
+        finally:
+            path = uri.split("://", 1)[-1].split("/", 1)[-1].split("?", 1)[0]
+            registry.record_call(self.api, f"{method} {operation_name(path)}", time.perf_counter() - started, ok)
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
@@ -1,68 +1,148 @@
 import os
-import requests
 import datetime
 import streamlit as st
 import re
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
+from Agents import http_client
+from Agents.instrumentation import agent, bind, registry
+from Agents.registry import thread_http
+from Agents.llm_stream import stream_chat
+from Agents.availability import load_busy_index
+from Agents.routine_profile import RoutineProfile
+from Agents.routine_cache import get_routine_cache
+from Agents.event_store import get_event_store
+from Agents.slot_engine import find_free_slots, next_slot_start, HORIZON_DAYS
 
-def fetch_past_events(service, email, days_back=14):
-    now = datetime.datetime.utcnow()
-    past = now - datetime.timedelta(days=days_back)
-    try:
-        events_result = service.events().list(
-            calendarId=email,
-            timeMin=past.isoformat() + "Z",
-            timeMax=now.isoformat() + "Z",
-            singleEvents=True,
-            orderBy="startTime"
-        ).execute()
-        return events_result.get("items", [])
-    except Exception as e:
-        st.warning(f"⚠️ Could not fetch events for {email}: {e}")
+MEETING_MINUTES = 30
+MAX_SUGGESTIONS = 5
+MAX_RANKED_CANDIDATES = 40   # earliest feasible slots shown to the LLM for ranking
+
+GROQ_URL = os.getenv("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
+NEGOTIATOR_MODEL = "llama3-8b-8192"
+SLOT_PATTERN = re.compile(r"(\d{4}-\d{2}-\d{2} \d{2}:\d{2})")
+
+HISTORY_DAYS = 14
+
+
+def _complete(prompt, temperature, on_token=None):
+    """
+    One Groq chat completion for `prompt`. With `on_token` the reply is streamed and
+    every text delta is passed to it as it arrives; the full reply is returned either way.
+    """
+    payload = {
+        "model": NEGOTIATOR_MODEL,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": temperature
+    }
+    if on_token:
+        parts = []
+        for delta in stream_chat(GROQ_URL, os.getenv("GROQ_API_KEY"), payload):
+            parts.append(delta)
+            on_token(delta)
+        return "".join(parts).strip()
+
+    response = http_client.post(
+        GROQ_URL,
+        "groq",
+        headers={
+            "Authorization": f"Bearer {os.getenv('GROQ_API_KEY')}",
+            "Content-Type": "application/json"
+        },
+        json=payload
+    )
+    response.raise_for_status()
+
+    data = response.json()
+    registry.record_usage(payload["model"], data.get("usage"))
+    return data["choices"][0]["message"]["content"].strip()
+
+
+def fetch_past_events(service, email, days_back=HISTORY_DAYS, http=None, warn=st.warning, synced=None):
+    """
+    Every event of `email` in the last `days_back` days, read from the local mirror after
+    bringing it up to date. `synced` is the result of a sync the caller already ran for `email`.
+    Titles and descriptions are never fetched from Google.
+    """
+    store = get_event_store()
+    if synced is None:
+        synced = store.sync(service, email, http=http)
+    if not synced:
+        warn(f"⚠️ Could not fetch events for {email}: {store.error(email)}")
         return []
+    now = datetime.datetime.utcnow()
+    return store.events(email, now - datetime.timedelta(days=days_back), now)
 
 
-def summarize_routine(events):
+def summarize_routine(events, on_token=None, days_back=HISTORY_DAYS):
     if not events:
         return "No recent events available."
 
-    entries = []
-    for event in events:
-        try:
-            start = event["start"].get("dateTime", event["start"].get("date"))
-            end = event["end"].get("dateTime", event["end"].get("date"))
-            summary = event.get("summary", "Busy")
-            entries.append(f"- {start} to {end} | {summary}")
-        except Exception:
-            continue
+    # The LLM sees a fixed-size hour-of-week histogram, never the events themselves
+    now = datetime.datetime.utcnow()
+    profile = RoutineProfile.from_events(events, now - datetime.timedelta(days=days_back), now)
 
     prompt = f"""
-You are a calendar assistant. Based on the following event history, summarize this user's preferred weekly routine in UTC.
+You are a calendar assistant. Based on the following summary of a user's calendar history, summarize this user's preferred weekly routine in UTC.
 
-Event history:
-{chr(10).join(entries)}
+{profile.to_prompt()}
 
 Only return the summary like: "Usually free 10:00–12:00 and 14:00–16:00 UTC on weekdays."
 """
 
-    response = requests.post(
-        "https://api.groq.com/openai/v1/chat/completions",
-        headers={
-            "Authorization": f"Bearer {os.getenv('GROQ_API_KEY')}",
-            "Content-Type": "application/json"
-        },
-        json={
-            "model": "llama3-8b-8192",
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.2
-        }
-    )
+    return _complete(prompt, temperature=0.2, on_token=on_token)
 
-    return response.json()["choices"][0]["message"]["content"].strip()
 
+@agent("negotiator")
+def get_routine(calendar_service, email, http=None, warn=st.warning, on_token=None):
+    """
+    Returns (summary, from_cache) for `email`. A cached profile is reused until its TTL
+    expires or the attendee's calendar changes; otherwise history is fetched and summarized,
+    streaming the new summary to `on_token` if given.
+    """
+    cache = get_routine_cache()
+    store = get_event_store()
+    synced = store.sync(calendar_service, email, http=http)
+    cached = cache.get(email)
+    if cached:
+        summary, synced_at = cached
+        # Unreadable calendars keep their profile; otherwise the mirror's last change decides
+        if not synced or not store.changed_since(email, synced_at):
+            registry.record_cache("routine", True)
+            return summary, True
+        cache.invalidate(email)
+    registry.record_cache("routine", False)
 
-def negotiate_time_slots(routines):
-    prompt = f"""
+    events = fetch_past_events(calendar_service, email, http=http, warn=warn, synced=synced)
+    synced_at = time.time()
+    summary = summarize_routine(events, on_token)
+    # Empty histories cost no LLM call and are often transient read errors, so they are not kept
+    if events:
+        cache.put(email, summary, synced_at)
+    return summary, False
+
+
+def _negotiation_prompt(routines, candidates=None):
+    if candidates:
+        candidate_lines = chr(10).join(f"- {c.strftime('%Y-%m-%d %H:%M')}" for c in candidates)
+        prompt = f"""
+You are a meeting negotiation assistant. Every participant is free for 30 minutes at each of the candidate times below (UTC).
+Pick the 3–5 candidates that best fit everyone's routine, best first.
+
+Participant routines:
+{chr(10).join([f"- {r}" for r in routines])}
+
+Candidate times:
+{candidate_lines}
+
+Return only a bullet list of times copied from the candidates in this format:
+- YYYY-MM-DD HH:MM
+- YYYY-MM-DD HH:MM
+"""
+    else:
+        prompt = f"""
 You are a meeting negotiation assistant. Based on the following participant routines, suggest 3–5 compatible 30-minute time slots **tomorrow** in UTC that fit everyone's routine.
 
 Participant routines:
@@ -73,51 +153,191 @@ Return only a bullet list of times in this format:
 - YYYY-MM-DD HH:MM
 """
 
-    st.info("🤖 AI is negotiating optimal time slots...")
+    return prompt
 
-    response = requests.post(
-        "https://api.groq.com/openai/v1/chat/completions",
-        headers={
-            "Authorization": f"Bearer {os.getenv('GROQ_API_KEY')}",
-            "Content-Type": "application/json"
-        },
-        json={
-            "model": "llama3-8b-8192",
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.3
-        }
+
+def _request_slot_reply(prompt, on_token=None):
+    return _complete(prompt, temperature=0.3, on_token=on_token)
+
+
+class SlotStreamParser:
+    """
+    Parses suggested slots out of a reply while it is still streaming: each line is parsed
+    as soon as its newline arrives, so the first slot is known before the reply finishes.
+    With `candidates`, only those times are accepted.
+    """
+
+    def __init__(self, candidates=None):
+        self.allowed = set(candidates) if candidates else None
+        self.slots = []
+        self._buffer = ""
+
+    def feed(self, text):
+        """Adds streamed text and returns the slots completed by it."""
+        self._buffer += text
+        *lines, self._buffer = self._buffer.split("\n")
+        return [slot for line in lines for slot in self._parse_line(line)]
+
+    def close(self):
+        """Parses whatever is left after the final delta."""
+        line, self._buffer = self._buffer, ""
+        return self._parse_line(line)
+
+    def _parse_line(self, line):
+        new = []
+        for match in SLOT_PATTERN.findall(line):
+            try:
+                slot = datetime.datetime.strptime(match, "%Y-%m-%d %H:%M")
+            except ValueError:
+                continue
+            if (self.allowed is None or slot in self.allowed) and slot not in self.slots:
+                self.slots.append(slot)
+                new.append(slot)
+        return new
+
+
+def _render_slots(placeholder, slots, streaming):
+    lines = "\n".join(f"- 🕒 {slot.strftime('%Y-%m-%d %H:%M')} UTC" for slot in slots)
+    placeholder.markdown(lines + ("\n\n⏳ _AI is still ranking..._" if streaming else ""))
+
+
+@agent("negotiator")
+def find_candidate_slots(attendees, calendar_service, duration_minutes=MEETING_MINUTES,
+                         horizon_days=HORIZON_DAYS):
+    """Every slot in the next `horizon_days` where all attendees are free, from mirrored calendars or freebusy."""
+    start = next_slot_start()
+    end = start + datetime.timedelta(days=horizon_days)
+    index = load_busy_index(calendar_service, [email for _, email, _ in attendees], start, end,
+                            store=get_event_store())
+    return find_free_slots(index, start, end, duration_minutes=duration_minutes)
+
+
+# ------------------------
+# Async execution: every attendee is processed concurrently.
+# Blocking Calendar/Groq calls run on worker threads; Streamlit calls stay on the
+# event-loop thread, which is the script thread that called the sync wrapper.
+# ------------------------
+async def _stream_in_thread(fn, render):
+    """
+    Runs `fn(on_token)` on a worker thread and calls `render(delta)` on the event-loop
+    thread for every streamed delta, so Streamlit elements update while the reply arrives.
+    Returns fn's result.
+    """
+    loop = asyncio.get_running_loop()
+    deltas = asyncio.Queue()
+    task = asyncio.ensure_future(
+        asyncio.to_thread(fn, lambda delta: loop.call_soon_threadsafe(deltas.put_nowait, delta))
     )
+    while not task.done():
+        getter = asyncio.ensure_future(deltas.get())
+        done, _ = await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+        if getter in done:
+            render(getter.result())
+        else:
+            getter.cancel()
+    # Deltas are queued before the task completes, so anything left is drained in order
+    while not deltas.empty():
+        render(deltas.get_nowait())
+    return task.result()
 
-    reply = response.json()["choices"][0]["message"]["content"].strip()
-    st.success("✅ AI has suggested time slots. Please choose one below.")
+
+async def get_routine_async(calendar_service, email, render=None):
+    warnings = []
+    result = await _stream_in_thread(
+        lambda on_token: get_routine(
+            calendar_service, email, http=thread_http(calendar_service), warn=warnings.append,
+            on_token=on_token if render else None
+        ),
+        render or (lambda delta: None),
+    )
+    for warning in warnings:
+        st.warning(warning)
+    return result
+
+
+@agent("negotiator")
+async def negotiate_time_slots_async(routines, candidates=None):
+    """
+    Asks the LLM for 3–5 slots that fit everyone's routine, showing them as they stream in.
+    With `candidates`, the LLM only ranks those feasible slots and anything it
+    invents outside the list is dropped.
+    """
+    st.info("🤖 AI is negotiating optimal time slots...")
+    placeholder = st.empty()
+    parser = SlotStreamParser(candidates)
+    prompt = _negotiation_prompt(routines, candidates)
+
+    def render(delta):
+        if parser.feed(delta):
+            _render_slots(placeholder, parser.slots, streaming=True)
+
+    reply = await _stream_in_thread(lambda on_token: _request_slot_reply(prompt, on_token), render)
+    parser.close()
     print("\n✅ Suggested Time Slots by LLM:\n", reply)
+    placeholder.empty()
+    st.success("✅ AI has suggested time slots. Please choose one below.")
+    return parser.slots
 
-    # ✅ Robust datetime parser using regex
-    slots = []
-    for match in re.findall(r"(\d{4}-\d{2}-\d{2} \d{2}:\d{2})", reply):
-        try:
-            dt = datetime.datetime.strptime(match, "%Y-%m-%d %H:%M")
-            slots.append(dt)
-        except Exception:
-            continue
 
-    return slots
+async def _gather_routines(attendees, calendar_service):
+    async def one(name, email):
+        # Each attendee's routine streams into its own line while it is being summarized
+        placeholder = st.empty()
+        streamed = []
 
+        def render(delta):
+            streamed.append(delta)
+            placeholder.caption(f"🧠 {name}: {''.join(streamed)}▌")
 
-def suggest_meeting_time(attendees, calendar_service):
-    st.info("🧠 Gathering routines for negotiation...")
-    routines = []
-    for name, email, _ in attendees:
-        st.write(f"📅 Fetching routine for **{name}**...")
-        events = fetch_past_events(calendar_service, email)
-        summary = summarize_routine(events)
-        st.success(f"🧠 {name}'s routine summarized.")
-        routines.append(f"{name}: {summary}")
-
-    slots = negotiate_time_slots(routines)
-
-    if not slots:
+        summary, from_cache = await get_routine_async(calendar_service, email, render)
+        placeholder.success(f"🧠 {name}'s routine {'loaded from cache' if from_cache else 'summarized'}.")
+        return f"{name}: {summary}"
+
+    st.write(f"📅 Fetching routines for **{', '.join(name for name, _, _ in attendees)}**...")
+    return await asyncio.gather(*(one(name, email) for name, email, _ in attendees))
+
+
+async def suggest_meeting_time_async(attendees, calendar_service):
+    st.info("📆 Finding slots where everyone is free...")
+    candidates = await asyncio.to_thread(find_candidate_slots, attendees, calendar_service)
+    if not candidates:
         st.error("❌ Could not find suitable time slots.")
         return []
+    st.success(f"✅ Found {len(candidates)} free slots in the next {HORIZON_DAYS} days.")
+
+    # The LLM only ranks feasible slots; without a Groq key the earliest ones are used
+    if not os.getenv("GROQ_API_KEY"):
+        return candidates[:MAX_SUGGESTIONS]
+
+    shortlist = candidates[:MAX_RANKED_CANDIDATES]
+    try:
+        st.info("🧠 Gathering routines for negotiation...")
+        routines = await _gather_routines(attendees, calendar_service)
+        slots = await negotiate_time_slots_async(routines, shortlist)
+    except Exception as e:
+        st.warning(f"⚠️ AI ranking failed, using the earliest free slots: {e}")
+        slots = []
+
+    # Top up with the earliest feasible slots if the LLM picked fewer than we show
+    for slot in shortlist:
+        if len(slots) >= MAX_SUGGESTIONS:
+            break
+        if slot not in slots:
+            slots.append(slot)
 
     return slots
+
+
+def run_sync(coro):
+    """Runs `coro` to completion from synchronous code such as a Streamlit script."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    # Already inside an event loop: run on a fresh loop in a helper thread
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(bind(asyncio.run), coro).result()
+
+
+def suggest_meeting_time(attendees, calendar_service):
+    return run_sync(suggest_meeting_time_async(attendees, calendar_service))
@@ -0,0 +1,62 @@
+import json
+
+from Agents import http_client
+from Agents.instrumentation import registry
+
+
+def parse_sse(lines):
+    """
+    Incremental Server-Sent Events parser. Consumes lines as they arrive and yields
+    each event's data as soon as the blank line that terminates the event is seen.
+    """
+    data = []
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if not line:
+            if data:
+                yield "\n".join(data)
+                data = []
+            continue
+        if line.startswith(":"):
+            continue    # comment / keep-alive
+        field, _, value = line.partition(":")
+        if value.startswith(" "):
+            value = value[1:]
+        if field == "data":
+            data.append(value)
+    if data:
+        yield "\n".join(data)
+
+
+def stream_chat(url, api_key, payload):
+    """
+    Posts an OpenAI-compatible chat completion with stream=True and yields content deltas
+    as they arrive. Raises `requests` errors (e.g. HTTP 429) before the first delta.
+    """
+    response = http_client.post(
+        url,
+        "groq",
+        headers={
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        },
+        json={**payload, "stream": True},
+        stream=True,
+    )
+    try:
+        response.raise_for_status()
+        # chunk_size=None hands over bytes as soon as they are received
+        for data in parse_sse(response.iter_lines(chunk_size=None)):
+            if data == "[DONE]":
+                # Read on to the end of the body so the keep-alive connection goes back to the pool
+                continue
+            chunk = json.loads(data)
+            # Groq reports token usage on the final chunk, under x_groq
+            registry.record_usage(payload.get("model"), (chunk.get("x_groq") or {}).get("usage") or chunk.get("usage"))
+            for choice in chunk.get("choices", []):
+                delta = (choice.get("delta") or {}).get("content")
+                if delta:
+                    yield delta
+    finally:
+        response.close()
@@ -0,0 +1,119 @@
+import re
+import datetime
+
+# Gmail operators answered from the local index; any other `word:` operator is sent to Gmail
+TEXT_FIELDS = {"from": "sender", "subject": "subject"}
+DATE_UNITS = {"d": 1, "m": 30, "y": 365}
+TOKEN_PATTERN = re.compile(r'(-?)(?:(\w+):)?("[^"]*"?|\S+)')
+QUOTED = re.compile(r'"[^"]*"?')
+GROUPING = re.compile(r"[(){}]")
+
+
+class UnsupportedQueryError(ValueError):
+    """Raised for Gmail search syntax the local index cannot answer."""
+
+
+class MailQuery:
+    """
+    A parsed Gmail-style query. `match` / `exclude` are FTS5 expressions over subject, sender,
+    snippet and body; `after` / `before` bound internalDate (epoch ms); `mailboxes` /
+    `not_mailboxes` are label-backed mailbox mirrors (e.g. "is:unread") a message must or must not be in.
+    """
+
+    def __init__(self):
+        self.terms = []
+        self.excluded = []
+        self.after = None
+        self.before = None
+        self.mailboxes = []
+        self.not_mailboxes = []
+
+    @property
+    def match(self):
+        return " AND ".join(self.terms) or None
+
+    @property
+    def exclude(self):
+        return " OR ".join(self.excluded) or None
+
+
+def parse_query(text, mailboxes=(), complete_mailboxes=(), now=None):
+    """
+    Parses the supported subset of Gmail search syntax:
+    free text and "quoted phrases", from:, subject:, is:/in: for the mirrored `mailboxes`
+    (is:read only when "is:unread" is in `complete_mailboxes`), after: / before: (YYYY/MM/DD)
+    and newer_than: / older_than: (7d, 2m, 1y).
+    A leading `-` negates a term; AND is implied. Raises UnsupportedQueryError for anything else,
+    including OR and ( ) / { } grouping, which the local index would otherwise read as words.
+    """
+    now = now or datetime.datetime.utcnow()
+    query = MailQuery()
+    if GROUPING.search(QUOTED.sub("", text or "")):
+        raise UnsupportedQueryError("Grouping with ( ) or { } is not supported locally")
+    for negate, operator, value in TOKEN_PATTERN.findall(text or ""):
+        operator = (operator or "").lower()
+        if not operator and not negate and value in ("OR", "AND"):
+            if value == "OR":
+                raise UnsupportedQueryError("OR is not supported locally")
+            continue
+        value = value.strip('"')
+        if not value:
+            continue
+
+        if operator in ("", *TEXT_FIELDS):
+            phrase = _phrase(value, TEXT_FIELDS.get(operator))
+            if phrase:
+                (query.excluded if negate else query.terms).append(phrase)
+        elif operator in ("is", "in"):
+            mailbox = f"{operator}:{value.lower()}"
+            if mailbox == "is:read" and "is:unread" in complete_mailboxes:
+                negate, mailbox = not negate, "is:unread"
+            elif mailbox not in mailboxes:
+                raise UnsupportedQueryError(f"{mailbox} is not kept in the local mailbox")
+            (query.not_mailboxes if negate else query.mailboxes).append(mailbox)
+        elif negate:
+            raise UnsupportedQueryError(f"-{operator}: is not supported locally")
+        elif operator in ("after", "before"):
+            moment = _parse_date(value)
+            if operator == "after":
+                query.after = _epoch_ms(moment)
+            else:
+                query.before = _epoch_ms(moment)
+        elif operator in ("newer_than", "older_than"):
+            moment = now - _parse_age(value)
+            if operator == "newer_than":
+                query.after = _epoch_ms(moment)
+            else:
+                query.before = _epoch_ms(moment)
+        else:
+            raise UnsupportedQueryError(f"{operator}: is not supported locally")
+    return query
+
+
+def _phrase(value, column=None):
+    """An FTS5 phrase for `value`, optionally restricted to one column; None when it has no words."""
+    if not re.search(r"\w", value):
+        return None
+    phrase = '"' + value.replace('"', '""') + '"'
+    return f"{column} : {phrase}" if column else phrase
+
+
+def _parse_date(value):
+    for fmt in ("%Y/%m/%d", "%Y-%m-%d", "%m/%d/%Y"):
+        try:
+            return datetime.datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise UnsupportedQueryError(f"Unrecognized date: {value}")
+
+
+def _parse_age(value):
+    match = re.fullmatch(r"(\d+)([dmy])", value.lower())
+    if not match:
+        raise UnsupportedQueryError(f"Unrecognized age: {value}")
+    return datetime.timedelta(days=int(match.group(1)) * DATE_UNITS[match.group(2)])
+
+
+def _epoch_ms(moment):
+    """Milliseconds since the epoch for a naive UTC datetime, the unit of Gmail's internalDate."""
+    return int(moment.replace(tzinfo=datetime.timezone.utc).timestamp() * 1000)
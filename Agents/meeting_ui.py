@@ -1,5 +1,6 @@
 import streamlit as st
 from Agents.calendar_agent import CalendarAgent
+from Agents.outbox import get_outbox
 
 def display_meetings(calendar: CalendarAgent):
     st.header("👥 Schedule a Team Meeting")
@@ -68,3 +69,13 @@ def display_meetings(calendar: CalendarAgent):
             # Clear UI state
             st.session_state.suggested_slots = []
             st.session_state.selected_slot_str = None
+
+    # 📬 Invitations are sent by the background outbox; show where each one is
+    recent = get_outbox().recent_meetings()
+    if recent:
+        st.subheader("📬 Invitation Delivery")
+        st.button("🔄 Refresh delivery status")
+        for meeting_id, label, counts in recent:
+            summary = " · ".join(f"{status}: {n}" for status, n in sorted(counts.items()))
+            with st.expander(f"📨 {label} — {summary}"):
+                st.table(get_outbox().status(meeting_id))
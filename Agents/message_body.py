@@ -0,0 +1,183 @@
+import os
+import re
+import base64
+import codecs
+from html.parser import HTMLParser
+
+# Body tier: at most this many characters of readable text are kept per message (~2k tokens)
+MAX_BODY_CHARS = int(os.getenv("OPSPILOT_MAX_BODY_CHARS", "8000"))
+DECODE_CHUNK = 16 * 1024     # base64 characters decoded per step; a multiple of 4
+MAX_LINE_CHARS = 4096        # text without newlines is handed on in pieces of this size
+
+# Lines that start the quoted history of a reply or forward; everything after them is dropped
+QUOTE_HEADERS = [
+    re.compile(r"^On .{4,200}wrote:\s*$"),
+    re.compile(r"^-{2,}\s*Original Message\s*-{2,}", re.I),
+    re.compile(r"^-{2,}\s*Forwarded message\s*-{2,}", re.I),
+    re.compile(r"^_{10,}\s*$"),                       # Outlook separator
+    re.compile(r"^--\s*$"),                           # signature delimiter
+]
+
+# Outlook header block of the quoted message: a From: line only counts when header lines follow it
+OUTLOOK_FROM = re.compile(r"^From:\s.*[@<]")
+OUTLOOK_HEADER = re.compile(r"^(Sent|Date|To|Cc|Subject):\s", re.I)
+
+
+def iter_text_parts(payload):
+    """
+    Yields (mime_type, body_data) for the readable parts of a `format=full` payload, best first:
+    text/plain when the message has it, text/html otherwise. Attachments are never followed.
+    """
+    plain, html = [], []
+
+    def walk(part):
+        if part.get("filename") or part.get("body", {}).get("attachmentId"):
+            return    # attachment: metadata only, the data is never requested
+        mime = part.get("mimeType", "")
+        if mime.startswith("multipart/"):
+            for child in part.get("parts", []):
+                walk(child)
+        elif mime == "text/plain" and part.get("body", {}).get("data"):
+            plain.append(part["body"]["data"])
+        elif mime == "text/html" and part.get("body", {}).get("data"):
+            html.append(part["body"]["data"])
+
+    walk(payload)
+    for data in plain:
+        yield "text/plain", data
+    if not plain:
+        for data in html:
+            yield "text/html", data
+
+
+def iter_decoded(data, chunk=DECODE_CHUNK):
+    """Decodes base64url `data` to text piece by piece, so a huge part is never decoded in one go."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    for start in range(0, len(data), chunk):
+        piece = data[start:start + chunk]
+        if start + chunk >= len(data):
+            piece += "=" * (-len(piece) % 4)
+        yield decoder.decode(base64.urlsafe_b64decode(piece))
+    yield decoder.decode(b"", final=True)
+
+
+class _HTMLText(HTMLParser):
+    """Incremental HTML-to-text converter; text is collected as it is fed."""
+
+    BLOCK_TAGS = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "blockquote", "table"}
+    SKIP_TAGS = {"script", "style", "head"}
+    VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out = []
+        self._skip = 0
+        self._quote = 0
+        self._open = []     # (tag, starts a quote) for every element not closed yet
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip += 1
+        # Gmail and Outlook wrap quoted history in blockquote / gmail_quote containers
+        quote = tag == "blockquote" or any(
+            name == "class" and "gmail_quote" in (value or "").split() for name, value in attrs
+        )
+        if tag not in self.VOID_TAGS:
+            self._open.append((tag, quote))
+            self._quote += quote
+        if tag in self.BLOCK_TAGS:
+            self.out.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS and self._skip:
+            self._skip -= 1
+        # Closing an element also closes anything left open inside it (e.g. an unclosed <p>)
+        if any(open_tag == tag for open_tag, _ in self._open):
+            while True:
+                open_tag, quote = self._open.pop()
+                self._quote -= quote
+                if open_tag == tag:
+                    break
+        if tag in self.BLOCK_TAGS:
+            self.out.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip and not self._quote:
+            # Source line breaks and indentation inside text are just whitespace in HTML
+            self.out.append(re.sub(r"\s+", " ", data))
+
+    def take(self):
+        text, self.out = "".join(self.out), []
+        return text
+
+
+def iter_lines(mime_type, data):
+    """Yields the lines of one text part as it is decoded."""
+    html = _HTMLText() if mime_type == "text/html" else None
+    pending = ""
+    for text in iter_decoded(data):
+        if html:
+            html.feed(text)
+            text = html.take()
+        pending += text
+        *lines, pending = pending.replace("\r\n", "\n").split("\n")
+        yield from (_tidy(line, html) for line in lines)
+        while len(pending) > MAX_LINE_CHARS:
+            yield _tidy(pending[:MAX_LINE_CHARS], html)
+            pending = pending[MAX_LINE_CHARS:]
+    if html:
+        html.close()
+        pending += html.take()
+    yield from (_tidy(line, html) for line in pending.split("\n"))
+
+
+def _tidy(line, html):
+    return line.strip() if html else line
+
+
+def extract_body(payload, max_chars=MAX_BODY_CHARS):
+    """
+    Readable text of a message: its text/plain parts (or text/html ones), decoded incrementally, without quoted
+    replies or signatures, and cut at `max_chars`. Decoding stops as soon as the cap is hit.
+    """
+    kept, size, blank = [], 0, False
+    for line in _own_lines(payload):
+        if line.startswith(">"):
+            continue
+        if not line:
+            # Collapse runs of blank lines
+            if blank or not kept:
+                continue
+            blank = True
+        else:
+            blank = False
+        kept.append(line)
+        size += len(line) + 1
+        if size >= max_chars:
+            return _finish(kept)[:max_chars]
+    return _finish(kept)
+
+
+def _own_lines(payload):
+    """Lines of the message's readable text up to where its quoted history starts."""
+    held = None
+    for mime_type, data in iter_text_parts(payload):
+        for line in iter_lines(mime_type, data):
+            line = line.rstrip()
+            if held is not None:
+                if OUTLOOK_HEADER.match(line):
+                    return
+                yield held
+                held = None
+            if any(pattern.match(line) for pattern in QUOTE_HEADERS):
+                return
+            if OUTLOOK_FROM.match(line):
+                held = line
+                continue
+            yield line
+    if held is not None:
+        yield held
+
+
+def _finish(lines):
+    return "\n".join(lines).strip()
@@ -0,0 +1,277 @@
+import os
+import time
+import threading
+
+from Agents.storage import cache_path, connect
+from Agents.sessions import scoped, USER_SQLITE_CACHE_KIB
+
+SCHEMA_VERSION = 2
+MAX_STORE_BYTES = int(os.getenv("OPSPILOT_MESSAGE_STORE_MB", "64")) * 1024 * 1024
+USER_STORE_BYTES = int(os.getenv("OPSPILOT_USER_MESSAGE_STORE_MB", "16")) * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE messages (
+    num INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    subject TEXT,
+    sender TEXT,
+    date TEXT,
+    snippet TEXT,
+    body TEXT,
+    timestamp INTEGER,
+    size INTEGER,
+    last_access REAL
+);
+CREATE INDEX messages_last_access ON messages (last_access);
+CREATE INDEX messages_timestamp ON messages (timestamp);
+
+-- Full-text index over the stored messages, kept up to date by the triggers below
+CREATE VIRTUAL TABLE messages_fts USING fts5(
+    subject, sender, snippet, body, content='messages', content_rowid='num'
+);
+CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, subject, sender, snippet, body)
+    VALUES (new.num, new.subject, new.sender, new.snippet, new.body);
+END;
+CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, subject, sender, snippet, body)
+    VALUES ('delete', old.num, old.subject, old.sender, old.snippet, old.body);
+END;
+CREATE TRIGGER messages_fts_update AFTER UPDATE OF subject, sender, snippet, body ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, subject, sender, snippet, body)
+    VALUES ('delete', old.num, old.subject, old.sender, old.snippet, old.body);
+    INSERT INTO messages_fts (rowid, subject, sender, snippet, body)
+    VALUES (new.num, new.subject, new.sender, new.snippet, new.body);
+END;
+
+-- Mailbox mirrors: which message ids match a query, and the historyId they were synced at
+CREATE TABLE mailboxes (
+    query TEXT,
+    max_results INTEGER,
+    history_id TEXT,
+    complete INTEGER,
+    PRIMARY KEY (query, max_results)
+);
+CREATE TABLE mailbox_members (
+    query TEXT,
+    max_results INTEGER,
+    message_id TEXT,
+    PRIMARY KEY (query, max_results, message_id)
+);
+"""
+
+
+class MailboxMirror:
+    """
+    The message ids matching one label-backed query, plus the last seen historyId.
+    `complete` is False when the query matched more than `max_results` messages.
+    """
+
+    def __init__(self, query, max_results, history_id=None, complete=False, message_ids=None):
+        self.query = query
+        self.max_results = max_results
+        self.history_id = history_id
+        self.complete = complete
+        self.message_ids = set(message_ids or [])
+
+
+class MessageStore:
+    """
+    SQLite-backed store of Gmail messages keyed by message id.
+    Holds headers, snippet and decoded body; least recently read messages are evicted
+    once the stored content exceeds `max_bytes`. Mailbox mirrors are never evicted.
+    """
+
+    def __init__(self, path=None, max_bytes=MAX_STORE_BYTES, cache_kib=None):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = connect(path or cache_path("messages.db"), SCHEMA_VERSION, SCHEMA, cache_kib)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------
+    # Messages
+    # ------------------------
+    def get_many(self, msg_ids):
+        """Returns {id: email} for the ids present in the store and marks them as recently used."""
+        msg_ids = list(msg_ids)
+        found = {}
+        with self._lock:
+            for i in range(0, len(msg_ids), 500):
+                chunk = msg_ids[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT * FROM messages WHERE id IN ({marks})", chunk
+                ).fetchall()
+                for row in rows:
+                    found[row["id"]] = _row_to_email(row)
+                with self._conn:
+                    self._conn.execute(
+                        f"UPDATE messages SET last_access=? WHERE id IN ({marks})", [time.time(), *chunk]
+                    )
+        return found
+
+    def put_many(self, emails):
+        """Inserts or updates emails; an existing decoded body is kept when `full_body` is not given."""
+        now = time.time()
+        rows = [
+            (
+                e["id"], e.get("subject"), e.get("sender"), e.get("date"),
+                e.get("body"), e.get("full_body"), e.get("timestamp", 0),
+                _size(e), now,
+            )
+            for e in emails if e.get("id")
+        ]
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """
+                INSERT INTO messages (id, subject, sender, date, snippet, body, timestamp, size, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    subject=excluded.subject, sender=excluded.sender, date=excluded.date,
+                    snippet=excluded.snippet, body=COALESCE(excluded.body, messages.body),
+                    timestamp=excluded.timestamp, last_access=excluded.last_access,
+                    size=excluded.size + CASE WHEN excluded.body IS NULL
+                        THEN COALESCE(length(CAST(messages.body AS BLOB)), 0) ELSE 0 END
+                """,
+                rows,
+            )
+            self._evict()
+
+    def set_body(self, msg_id, body):
+        """Stores the decoded body of an already stored message."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE messages SET size=size-COALESCE(length(CAST(body AS BLOB)), 0)+?, body=?, last_access=? WHERE id=?",
+                (len(body.encode("utf-8")), body, time.time(), msg_id),
+            )
+            self._evict()
+
+    def search(self, query, limit=500):
+        """
+        Stored messages matching a parsed MailQuery, newest first, answered from the
+        full-text index and the mailbox mirrors without any Gmail call.
+        """
+        clauses, params = [], []
+        if query.match:
+            clauses.append("num IN (SELECT rowid FROM messages_fts WHERE messages_fts MATCH ?)")
+            params.append(query.match)
+        if query.exclude:
+            clauses.append("num NOT IN (SELECT rowid FROM messages_fts WHERE messages_fts MATCH ?)")
+            params.append(query.exclude)
+        if query.after is not None:
+            clauses.append("timestamp >= ?")
+            params.append(query.after)
+        if query.before is not None:
+            clauses.append("timestamp < ?")
+            params.append(query.before)
+        for mailbox in query.mailboxes:
+            clauses.append("id IN (SELECT message_id FROM mailbox_members WHERE query=?)")
+            params.append(mailbox)
+        for mailbox in query.not_mailboxes:
+            clauses.append("id NOT IN (SELECT message_id FROM mailbox_members WHERE query=?)")
+            params.append(mailbox)
+
+        where = " AND ".join(clauses) or "1"
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM messages WHERE {where} ORDER BY timestamp DESC LIMIT ?", [*params, limit]
+            ).fetchall()
+        return [_row_to_email(row) for row in rows]
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM messages").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # Drop least recently read messages until we are back under the ceiling
+        to_free = total - self.max_bytes
+        victims = []
+        for row in self._conn.execute("SELECT id, size FROM messages ORDER BY last_access ASC"):
+            victims.append((row["id"],))
+            to_free -= row["size"]
+            if to_free <= 0:
+                break
+        self._conn.executemany("DELETE FROM messages WHERE id=?", victims)
+
+    # ------------------------
+    # Mailbox mirrors
+    # ------------------------
+    def load_mirror(self, query, max_results):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT history_id, complete FROM mailboxes WHERE query=? AND max_results=?",
+                (query, max_results),
+            ).fetchone()
+            if row is None:
+                return None
+            ids = [r[0] for r in self._conn.execute(
+                "SELECT message_id FROM mailbox_members WHERE query=? AND max_results=?",
+                (query, max_results),
+            )]
+        return MailboxMirror(query, max_results, row["history_id"], bool(row["complete"]), ids)
+
+    def mirrored_mailboxes(self):
+        """{query: complete} for every mailbox query with a stored mirror."""
+        with self._lock:
+            rows = self._conn.execute("SELECT query, MAX(complete) FROM mailboxes GROUP BY query").fetchall()
+        return {query: bool(complete) for query, complete in rows}
+
+    def save_mirror(self, mirror):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO mailboxes (query, max_results, history_id, complete) VALUES (?, ?, ?, ?)",
+                (mirror.query, mirror.max_results, mirror.history_id, int(mirror.complete)),
+            )
+            self._conn.execute(
+                "DELETE FROM mailbox_members WHERE query=? AND max_results=?",
+                (mirror.query, mirror.max_results),
+            )
+            self._conn.executemany(
+                "INSERT INTO mailbox_members (query, max_results, message_id) VALUES (?, ?, ?)",
+                [(mirror.query, mirror.max_results, msg_id) for msg_id in mirror.message_ids],
+            )
+
+
+def _size(email):
+    return sum(len((email.get(k) or "").encode("utf-8")) for k in ("subject", "sender", "date", "body", "full_body"))
+
+
+def _row_to_email(row):
+    return {
+        "id": row["id"],
+        "subject": row["subject"],
+        "sender": row["sender"],
+        "body": row["snippet"],
+        "full_body": row["body"],
+        "date": row["date"],
+        "timestamp": row["timestamp"],
+    }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_message_store():
+    """
+    MessageStore of the signed-in user, or the process-wide one in single-user mode,
+    shared by the Inbox, Dashboard and Reports pages.
+    """
+    return scoped(
+        "messages",
+        lambda session: MessageStore(session.path("messages.db"), USER_STORE_BYTES, USER_SQLITE_CACHE_KIB),
+        _shared_store,
+    )
+
+
+def _shared_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = MessageStore()
+    return _store
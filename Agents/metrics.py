@@ -0,0 +1,90 @@
+import time
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from Agents.instrumentation import agent, bind, registry
+from Agents.sessions import scoped
+from Agents.registry import thread_http
+from Agents.event_store import get_event_store
+
+METRICS_TTL = 60          # seconds a dashboard snapshot is reused
+EVENT_WINDOW_DAYS = 7
+
+
+class DashboardState:
+    """Last dashboard snapshot of one account."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.snapshot = None
+
+
+_shared_state = DashboardState()
+
+
+def _state():
+    return scoped("dashboard", lambda session: DashboardState(), lambda: _shared_state)
+
+
+def _recent_events(calendar):
+    """
+    (events, error): events of the last EVENT_WINDOW_DAYS on the primary calendar, from its local
+    mirror. When the sync fails, the last mirrored events are returned with the error, or None
+    if the calendar was never mirrored.
+    """
+    store = get_event_store()
+    # Runs on a pool thread, and the agent may be shared by several browser sessions
+    error = None
+    if not store.sync(calendar.service, "primary", http=thread_http(calendar.service)):
+        error = store.error("primary")
+        if not store.has_events("primary"):
+            return None, error
+    now = datetime.utcnow()
+    return store.events("primary", now - timedelta(days=EVENT_WINDOW_DAYS), now), error
+
+
+def _meeting_metrics(calendar):
+    """(meeting_count, unique_participants, calendar_error); the counts are None when unknown."""
+    events, error = _recent_events(calendar)
+    if events is None:
+        return None, None, error
+    participants = {
+        att["email"]
+        for ev in events
+        for att in ev.get("attendees", [])
+        if att.get("email")
+    }
+    return len(events), len(participants), error
+
+
+@agent("dashboard")
+def get_dashboard_metrics(inbox, calendar, ttl=METRICS_TTL):
+    """
+    Returns a snapshot dict with unread_count, meeting_count, unique_participants, calendar_error
+    and fetched_at. After a failed calendar sync the meeting counts come from the last mirrored
+    events (None if there are none) and calendar_error says why.
+    The unread count comes from Gmail label statistics and the meeting counts from a cached
+    event mirror; both are gathered concurrently and the snapshot is reused for `ttl` seconds.
+    """
+    state = _state()
+    with state.lock:
+        if state.snapshot and time.time() - state.snapshot["fetched_at"] < ttl:
+            registry.record_cache("dashboard", True)
+            return state.snapshot
+        registry.record_cache("dashboard", False)
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            unread = pool.submit(bind(inbox.unread_count))
+            meetings = pool.submit(bind(_meeting_metrics), calendar)
+            meeting_count, unique_participants, calendar_error = meetings.result()
+            unread_count = unread.result()
+
+        state.snapshot = {
+            "unread_count": unread_count,
+            "meeting_count": meeting_count,
+            "unique_participants": unique_participants,
+            "calendar_error": calendar_error,
+            "fetched_at": time.time(),
+        }
+        return state.snapshot
@@ -0,0 +1,240 @@
+import os
+import time
+import random
+import sqlite3
+import hashlib
+import threading
+import requests
+
+from Agents.storage import cache_path, connect
+from Agents.gmail_api import send_raw_message
+from Agents.instrumentation import tagged
+from Agents.sessions import current_user
+
+SCHEMA_VERSION = 2
+WORKERS = 4
+MAX_ATTEMPTS = 5
+POLL_INTERVAL = 2.0
+RETENTION_DAYS = int(os.getenv("OPSPILOT_OUTBOX_RETENTION_DAYS", "30"))   # sent / failed rows are kept this long
+PRUNE_INTERVAL = 3600
+
+SCHEMA = """
+CREATE TABLE outbox (
+    idempotency_key TEXT PRIMARY KEY,
+    owner TEXT,
+    meeting_id TEXT,
+    label TEXT,
+    recipient TEXT,
+    raw TEXT,
+    status TEXT,
+    attempts INTEGER DEFAULT 0,
+    next_attempt_at REAL,
+    last_error TEXT,
+    gmail_message_id TEXT,
+    created_at REAL,
+    updated_at REAL
+);
+CREATE INDEX outbox_due ON outbox (status, next_attempt_at);
+CREATE INDEX outbox_meeting ON outbox (meeting_id);
+"""
+
+# Statuses: queued -> sending -> sent | failed. A send that may or may not have reached
+# Gmail (timeout, crash mid-send) becomes "unknown" and is never retried automatically.
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+def idempotency_key(meeting_id, recipient):
+    return hashlib.sha256(f"{meeting_id}|{recipient.lower()}".encode("utf-8")).hexdigest()
+
+
+class Outbox:
+    """
+    Persistent queue of outgoing Gmail messages delivered by a pool of background workers.
+    Each (meeting, recipient) pair has an idempotency key, so enqueueing twice never sends twice.
+    Jobs remember the user who queued them and are sent with `token_provider(owner)`.
+    """
+
+    def __init__(self, token_provider, path=None, workers=WORKERS):
+        self.token_provider = token_provider
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pruned_at = 0.0
+        self._conn = connect(path or cache_path("outbox.db"), SCHEMA_VERSION, SCHEMA)
+
+        # Anything left mid-send by a previous process may already have been delivered
+        with self._conn:
+            self._conn.execute(
+                "UPDATE outbox SET status='unknown', last_error='Interrupted while sending' WHERE status='sending'"
+            )
+
+        for i in range(workers):
+            threading.Thread(target=self._run_worker, name=f"outbox-{i}", daemon=True).start()
+
+    def enqueue(self, meeting_id, label, messages):
+        """Queues (recipient, raw) pairs for `meeting_id` as the current user; duplicates are ignored."""
+        now = time.time()
+        owner = current_user()
+        rows = [
+            (idempotency_key(meeting_id, recipient), owner, meeting_id, label, recipient, raw, "queued", now, now, now)
+            for recipient, raw in messages
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """
+                INSERT OR IGNORE INTO outbox
+                    (idempotency_key, owner, meeting_id, label, recipient, raw, status, next_attempt_at,
+                     created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+        self._wake.set()
+
+    def status(self, meeting_id):
+        """Delivery status of every invitation for one of the current user's meetings."""
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT recipient, status, attempts, last_error FROM outbox
+                WHERE meeting_id=? AND owner IS ? ORDER BY recipient
+                """,
+                (meeting_id, current_user()),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def recent_meetings(self, limit=5):
+        """[(meeting_id, label, {status: count})] for the current user's most recently queued meetings."""
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT meeting_id, label, status, COUNT(*) AS n, MAX(created_at) AS created
+                FROM outbox WHERE owner IS ? GROUP BY meeting_id, status
+                """,
+                (current_user(),),
+            ).fetchall()
+        meetings = {}
+        for row in rows:
+            entry = meetings.setdefault(row["meeting_id"], {"label": row["label"], "created": 0, "counts": {}})
+            entry["counts"][row["status"]] = row["n"]
+            entry["created"] = max(entry["created"], row["created"])
+        ordered = sorted(meetings.items(), key=lambda item: item[1]["created"], reverse=True)[:limit]
+        return [(meeting_id, m["label"], m["counts"]) for meeting_id, m in ordered]
+
+    # ------------------------
+    # Workers
+    # ------------------------
+    def _claim(self):
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                """
+                SELECT idempotency_key, owner, recipient, raw, attempts FROM outbox
+                WHERE status='queued' AND next_attempt_at<=? ORDER BY next_attempt_at LIMIT 1
+                """,
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE outbox SET status='sending', attempts=attempts+1, updated_at=? WHERE idempotency_key=?",
+                (now, row["idempotency_key"]),
+            )
+        return row
+
+    def _finish(self, key, status, error=None, gmail_id=None, retry_in=None):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                UPDATE outbox SET status=?, last_error=?, gmail_message_id=?, next_attempt_at=?, updated_at=?
+                WHERE idempotency_key=?
+                """,
+                (status, error, gmail_id, now + (retry_in or 0), now, key),
+            )
+
+    def _prune(self):
+        """Deletes sent and failed jobs older than RETENTION_DAYS; "unknown" ones are kept for review."""
+        now = time.time()
+        with self._lock, self._conn:
+            if now - self._pruned_at < PRUNE_INTERVAL:
+                return
+            self._pruned_at = now
+            deleted = self._conn.execute(
+                "DELETE FROM outbox WHERE status IN ('sent', 'failed') AND updated_at < ?",
+                (now - RETENTION_DAYS * 86400,),
+            ).rowcount
+        if deleted:
+            print(f"🧹 Outbox pruned {deleted} delivered or failed invitation(s).")
+
+    def _run_worker(self):
+        with tagged(agent="outbox", page="background"):
+            self._work()
+
+    def _work(self):
+        # Database errors (e.g. "database is locked") must not kill the worker for the rest of the process
+        while True:
+            try:
+                job = self._claim()
+                if job is None:
+                    self._prune()
+            except sqlite3.Error as e:
+                print(f"⚠️ Outbox could not read the queue: {e}")
+                job = None
+            if job is None:
+                self._wake.wait(POLL_INTERVAL)
+                self._wake.clear()
+                continue
+
+            try:
+                self._deliver(job)
+            except sqlite3.Error as e:
+                # The job stays "sending" and is marked "unknown" on the next start, so it is never resent
+                print(f"⚠️ Outbox could not record the result for {job['recipient']}: {e}")
+
+    def _deliver(self, job):
+        """Sends one claimed job and records sent, retry, failed or unknown."""
+        key, recipient = job["idempotency_key"], job["recipient"]
+        attempts = job["attempts"] + 1
+        try:
+            sent = send_raw_message(self.token_provider(job["owner"]), job["raw"])
+        except requests.exceptions.HTTPError as e:
+            code = e.response.status_code if e.response is not None else None
+            if code in RETRYABLE_STATUSES and attempts < MAX_ATTEMPTS:
+                self._finish(key, "queued", str(e), retry_in=self._backoff(attempts))
+            else:
+                self._finish(key, "failed", str(e))
+                print(f"❌ Failed to send invitation to {recipient}: {e}")
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            # A read timeout means Gmail may have accepted the message; never resend blindly
+            if isinstance(e, requests.exceptions.ReadTimeout) or attempts >= MAX_ATTEMPTS:
+                self._finish(key, "unknown" if isinstance(e, requests.exceptions.ReadTimeout) else "failed", str(e))
+            else:
+                self._finish(key, "queued", str(e), retry_in=self._backoff(attempts))
+        except Exception as e:
+            # Includes an open circuit breaker: the request was never sent, so retry later
+            if attempts < MAX_ATTEMPTS:
+                self._finish(key, "queued", str(e), retry_in=self._backoff(attempts))
+            else:
+                self._finish(key, "failed", str(e))
+        else:
+            # Outside the try, so a failure to record the send can never queue it again
+            self._finish(key, "sent", gmail_id=sent.get("id"))
+            print(f"✅ Invitation delivered to {recipient} | Message ID: {sent.get('id')}")
+
+    @staticmethod
+    def _backoff(attempts):
+        return random.uniform(0, min(300, 2 ** attempts))
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox():
+    """Process-wide Outbox; each job is sent with the credentials of the user who queued it."""
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            from Agents.credentials import credential_provider_for
+            _outbox = Outbox(lambda owner: credential_provider_for(owner).token())
+    return _outbox
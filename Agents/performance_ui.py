@@ -0,0 +1,51 @@
+import streamlit as st
+from datetime import datetime
+
+from Agents.instrumentation import registry
+from Agents.sessions import MULTI_USER, sessions
+
+
+def display_performance():
+    st.header("⚡ Performance")
+
+    snapshot = registry.snapshot()
+    since = datetime.fromtimestamp(snapshot["since"]).strftime("%Y-%m-%d %H:%M:%S")
+    st.caption(f"📈 Every Gmail, Calendar and Groq call made by this process since {since}")
+    if MULTI_USER:
+        st.caption(f"👥 {sessions.active()} signed-in user session(s) open")
+
+    c1, c2, c3 = st.columns(3)
+    c1.download_button("⬇️ Prometheus", registry.to_prometheus(), file_name="opspilot_metrics.prom",
+                       mime="text/plain")
+    c2.download_button("⬇️ JSON", registry.to_json(), file_name="opspilot_metrics.json",
+                       mime="application/json")
+    if c3.button("🗑️ Reset metrics"):
+        registry.reset()
+        st.rerun()
+
+    st.subheader("🌐 External API calls")
+    if snapshot["calls"]:
+        st.dataframe(
+            [{k: v for k, v in call.items() if k != "buckets"} for call in snapshot["calls"]],
+            use_container_width=True,
+        )
+    else:
+        st.info("ℹ️ No external calls recorded yet. Open another page first.")
+
+    st.subheader("🗂️ Caches")
+    if snapshot["caches"]:
+        st.dataframe(
+            [
+                {**row, "hit_rate": f"{row['hits'] / (row['hits'] + row['misses']):.0%}"}
+                for row in snapshot["caches"]
+            ],
+            use_container_width=True,
+        )
+    else:
+        st.info("ℹ️ No cache lookups recorded yet.")
+
+    st.subheader("🧠 Groq token usage")
+    if snapshot["tokens"]:
+        st.dataframe(snapshot["tokens"], use_container_width=True)
+    else:
+        st.info("ℹ️ No LLM usage recorded yet.")
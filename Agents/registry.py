@@ -0,0 +1,103 @@
+import os
+import threading
+import streamlit as st
+from collections import OrderedDict
+from googleapiclient.discovery import build
+from googleapiclient.http import build_http
+from google_auth_httplib2 import AuthorizedHttp
+
+from Agents.instrumentation import InstrumentedHttp
+from Agents.sessions import scoped
+
+
+# Set to serve every Google API from another host, e.g. the bench/ stand-in server
+GOOGLE_API_ROOT = os.getenv("OPSPILOT_GOOGLE_API_ROOT")
+
+# servicePath of each discovery document, appended to GOOGLE_API_ROOT
+SERVICE_PATHS = {"calendar": "calendar/v3/"}
+
+MAX_THREAD_HTTPS = 8     # authorized transports each worker thread keeps, one per account
+
+_thread_local = threading.local()
+
+
+def build_service(name, version, credentials):
+    """
+    Builds a Google API client from the discovery documents bundled with
+    google-api-python-client, so no discovery round trip is made.
+    Requests go through an instrumented transport tagged with the API `name`.
+    """
+    http = InstrumentedHttp(AuthorizedHttp(credentials, http=build_http()), name)
+    client_options = None
+    if GOOGLE_API_ROOT:
+        client_options = {"api_endpoint": f"{GOOGLE_API_ROOT.rstrip('/')}/{SERVICE_PATHS.get(name, '')}"}
+    return build(name, version, http=http, static_discovery=True, cache_discovery=False,
+                 client_options=client_options)
+
+
+def thread_http(service, api="calendar"):
+    """
+    googleapiclient's httplib2 transport is not thread-safe, and cached agents are shared by
+    every browser session, so each thread (worker or script) executes requests through its own
+    authorized Http built from the service's credentials.
+    Only the MAX_THREAD_HTTPS most recently used accounts are kept per thread.
+    """
+    credentials = service._http.credentials
+    pool = getattr(_thread_local, "http", None)
+    if pool is None:
+        pool = _thread_local.http = OrderedDict()
+    key = (id(credentials), api)
+    if key not in pool:
+        pool[key] = (credentials, InstrumentedHttp(AuthorizedHttp(credentials, http=build_http()), api))
+        if len(pool) > MAX_THREAD_HTTPS:
+            pool.popitem(last=False)
+    pool.move_to_end(key)
+    return pool[key][1]
+
+
+# ------------------------
+# Agents: one set per signed-in user in multi-user mode, otherwise built once per process.
+# Either way they are reused by every Streamlit rerun and page switch.
+# Agent modules are imported lazily so the Home page never pays for them.
+# ------------------------
+def get_inbox_agent():
+    return scoped("inbox_agent", lambda session: _new_inbox_agent(), _shared_inbox_agent)
+
+
+def get_calendar_agent():
+    return scoped("calendar_agent", lambda session: _new_calendar_agent(), _shared_calendar_agent)
+
+
+def get_summary_agent():
+    # Summaries are cached by content and rate-limited per process, so every user shares one agent
+    return _shared_summary_agent()
+
+
+def _new_inbox_agent():
+    from Agents.inbox import InboxAgent
+    return InboxAgent()
+
+
+def _new_calendar_agent():
+    from Agents.calendar_agent import CalendarAgent
+    return CalendarAgent()
+
+
+@st.cache_resource(show_spinner="🔐 Connecting to Gmail...")
+def _shared_inbox_agent():
+    return _new_inbox_agent()
+
+
+@st.cache_resource(show_spinner="🔐 Connecting to Google Calendar...")
+def _shared_calendar_agent():
+    return _new_calendar_agent()
+
+
+@st.cache_resource(show_spinner=False)
+def _shared_summary_agent():
+    from Agents.Summary_Agent import SummaryAgent, GROQ_URL, GROQ_MODEL
+    return SummaryAgent(
+        api_key=os.getenv("GROQ_API_KEY"),
+        api_url=GROQ_URL,
+        model=GROQ_MODEL
+    )
@@ -1,16 +1,17 @@
 import streamlit as st
 
+from Agents.inbox import add_to_selection
+from Agents.summary_pipeline import SummaryPipeline
+from Agents.Summary_Agent import BATCH_TOKEN_BUDGET
+
 class ReportAgent:
     def __init__(self, inbox, summarizer):
         self.inbox = inbox
         self.summarizer = summarizer
+        self.pipeline = SummaryPipeline(summarizer, batch_budget=BATCH_TOKEN_BUDGET)
 
-    def _generate_markdown(self, emails):
-        sections = []
-        for idx, email in enumerate(emails, start=1):
-            summary = self.summarizer.summarize_email(email["subject"], email["body"])
-            sections.append(
-                f"""### ✉️ Email {idx}
+    def _render_section(self, idx, email, summary):
+        return f"""### ✉️ Email {idx}
 **From:** {email['sender']}  
 **Subject:** {email['subject']}  
 
@@ -18,8 +19,6 @@ class ReportAgent:
 {summary}  
 ---
 """
-            )
-        return "\n".join(sections)
 
     def display(self):
         st.header("📊 Generate Ops Report")
@@ -27,11 +26,47 @@ class ReportAgent:
         # Get selected emails from Inbox page
         emails = st.session_state.get("selected_emails", [])
 
+        # Candidates can also be picked with a search over the local mail index
+        with st.expander("🔎 Add emails by search"):
+            query = st.text_input("Gmail-style query", placeholder="from:ops@example.com newer_than:7d",
+                                  key="report_query")
+            if query:
+                candidates = self.inbox.search(query)
+                chosen = {e["id"] for e in emails}
+                new = [e for e in candidates if e["id"] not in chosen]
+                st.caption(f"🔎 {len(candidates)} match(es), {len(new)} not selected yet")
+                if new and st.button(f"➕ Add {len(new)} email(s) to the report"):
+                    add_to_selection(new)
+                    emails = st.session_state.selected_emails
+
         if not emails:
             st.warning("⚠️ No emails selected. Please mark emails in the Inbox tab.")
             return
 
         if st.button("📄 Generate Report"):
-            with st.spinner("🧠 Summarizing selected emails..."):
-                report_md = self._generate_markdown(emails)
-            st.markdown(report_md, unsafe_allow_html=True)
+            emails = self.inbox.load_for_report(emails)
+            progress = st.progress(0.0, text="🧠 Summarizing selected emails...")
+
+            # One placeholder per email, filled in as soon as its summary finishes
+            placeholders = [st.empty() for _ in emails]
+            for placeholder in placeholders:
+                placeholder.info("⏳ Waiting for summary...")
+
+            # Uncached summaries are streamed into their placeholder token by token
+            partial = {}
+            done = 0
+            for idx, text, finished in self.pipeline.stream(emails):
+                if finished:
+                    summary = text
+                    done += 1
+                    progress.progress(done / len(emails), text=f"🧠 Summarized {done}/{len(emails)} emails")
+                else:
+                    partial[idx] = partial.get(idx, "") + text
+                    summary = partial[idx] + "▌"
+                placeholders[idx].markdown(
+                    self._render_section(idx + 1, emails[idx], summary), unsafe_allow_html=True
+                )
+            progress.empty()
+
+            stats = self.summarizer.cache.stats()
+            st.caption(f"🗂️ Summary cache: {stats['hits']} hits · {stats['misses']} misses · {stats['entries']} stored")
@@ -0,0 +1,79 @@
+import os
+import time
+import threading
+
+from Agents.storage import cache_path, connect
+from Agents.sessions import scoped, USER_SQLITE_CACHE_KIB
+
+SCHEMA_VERSION = 1
+ROUTINE_TTL = int(os.getenv("ROUTINE_CACHE_TTL_HOURS", "168")) * 3600
+
+SCHEMA = """
+CREATE TABLE routines (
+    email TEXT PRIMARY KEY,
+    summary TEXT,
+    synced_at REAL
+);
+"""
+
+
+class RoutineCache:
+    """
+    Persistent routine profiles keyed by attendee email.
+    `synced_at` is when the event history behind a profile was read; profiles older than
+    `ttl` seconds are ignored, and newer changes in the event mirror invalidate them.
+    """
+
+    def __init__(self, path=None, ttl=ROUTINE_TTL, cache_kib=None):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = connect(path or cache_path("routines.db"), SCHEMA_VERSION, SCHEMA, cache_kib)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get(self, email):
+        """Returns (summary, synced_at) or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary, synced_at FROM routines WHERE email=?", (email.lower(),)
+            ).fetchone()
+        if row is None or time.time() - row["synced_at"] > self.ttl:
+            return None
+        return row["summary"], row["synced_at"]
+
+    def put(self, email, summary, synced_at):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO routines (email, summary, synced_at) VALUES (?, ?, ?)",
+                (email.lower(), summary, synced_at),
+            )
+
+    def invalidate(self, email):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM routines WHERE email=?", (email.lower(),))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_routine_cache():
+    """
+    RoutineCache of the signed-in user, or the process-wide one in single-user mode.
+    Profiles are built from what the requesting account may see, so they are never shared.
+    """
+    return scoped(
+        "routines",
+        lambda session: RoutineCache(session.path("routines.db"), cache_kib=USER_SQLITE_CACHE_KIB),
+        _shared_cache,
+    )
+
+
+def _shared_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = RoutineCache()
+    return _cache
@@ -0,0 +1,146 @@
+import math
+import datetime
+import numpy as np
+from collections import defaultdict
+
+from Agents.availability import BusyIndex, parse_api_time
+
+DAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+BLOCK_ROUNDING_MINUTES = 15  # start times and durations are snapped to this grid before matching
+MAX_BLOCKS = 8               # recurring blocks listed in the prompt, longest weekly total first
+MIN_BLOCK_DAYS = 3           # a start time seen on this many weekdays is reported as one block
+
+
+class RoutineProfile:
+    """
+    Fixed-size description of an attendee's calendar history: a 7 × 24 hour-of-week occupancy
+    histogram (UTC) plus the blocks that recur at the same time every week. Only start and end
+    times are used, so neither the size of the profile nor its contents depend on event titles
+    or on how many events there were.
+    """
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+        self.occupancy = np.zeros((7, 24))   # share of each hour of the week spent busy, 0..1
+        self.blocks = []                     # (days, start_minute, duration_minutes)
+        self.events = 0
+        self.all_day_days = 0
+
+    @classmethod
+    def from_events(cls, events, start, end):
+        """Builds the profile of `events` (Calendar API items) observed in [start, end) (naive UTC)."""
+        profile = cls(start, end)
+        intervals, all_day = [], set()
+        for event in events:
+            if event.get("status") == "cancelled" or event.get("transparency") == "transparent":
+                continue
+            try:
+                if "dateTime" not in event["start"]:
+                    # All-day events (leave, holidays) would fill the whole grid; they are only counted
+                    all_day.add(event["start"]["date"])
+                    continue
+                event_start = max(parse_api_time(event["start"]["dateTime"]), start)
+                event_end = min(parse_api_time(event["end"]["dateTime"]), end)
+            except (KeyError, ValueError):
+                continue
+            if event_start < event_end:
+                intervals.append((event_start, event_end))
+
+        profile.events = len(intervals)
+        profile.all_day_days = len(all_day)
+        profile.occupancy = _hour_of_week_occupancy(intervals, start, end)
+        profile.blocks = _recurring_blocks(intervals, start, end)
+        return profile
+
+    @property
+    def weeks(self):
+        return (self.end - self.start).total_seconds() / (7 * 24 * 3600)
+
+    def to_prompt(self):
+        """Text form for the LLM: 7 histogram rows, at most MAX_BLOCKS block lines and one summary line."""
+        rows = [
+            f"{DAY_NAMES[day]} " + "".join(str(min(9, math.ceil(share * 9))) for share in self.occupancy[day])
+            for day in range(7)
+        ]
+        blocks = [
+            f"- {_format_days(days)} {_format_minute(minute)}–{_format_minute(minute + duration)}"
+            for days, minute, duration in self.blocks
+        ] or ["- none"]
+        return (
+            f"Observed {self.weeks:.0f} weeks, {self.events} timed events, all-day events on {self.all_day_days} days.\n"
+            "Hour-of-week occupancy (UTC). One digit per hour from 00 to 23; "
+            "0 = always free, 9 = always busy:\n"
+            "    " + "".join(str(h % 10) for h in range(24)) + "\n"
+            + "\n".join(rows) + "\n"
+            "Recurring blocks (same time every week):\n"
+            + "\n".join(blocks)
+        )
+
+
+def _hour_of_week_occupancy(intervals, start, end):
+    """Busy minutes per (weekday, hour) divided by how many minutes of that hour the window contains."""
+    index = BusyIndex()
+    index.add_attendee("routine", intervals)     # overlapping events must not count twice
+    busy = np.zeros((7, 24))
+    for busy_start, busy_end in index.intervals("routine"):
+        _add_minutes(busy, busy_start, busy_end)
+    observed = np.zeros((7, 24))
+    _add_minutes(observed, start, end)
+    return np.divide(busy, observed, out=np.zeros((7, 24)), where=observed > 0)
+
+
+def _add_minutes(grid, start, end):
+    cursor = start
+    while cursor < end:
+        hour_end = cursor.replace(minute=0, second=0, microsecond=0) + datetime.timedelta(hours=1)
+        step_end = min(hour_end, end)
+        grid[cursor.weekday(), cursor.hour] += (step_end - cursor).total_seconds() / 60.0
+        cursor = step_end
+
+
+def _recurring_blocks(intervals, start, end):
+    """
+    Blocks that start at the same (rounded) time with the same duration on the same weekday in
+    at least half of the observed weeks, and never fewer than two. A start time that recurs on
+    MIN_BLOCK_DAYS or more weekdays is merged into one multi-day block.
+    """
+    weeks_seen = defaultdict(set)
+    for event_start, event_end in intervals:
+        minute = _round(event_start.hour * 60 + event_start.minute)
+        duration = max(BLOCK_ROUNDING_MINUTES, _round((event_end - event_start).total_seconds() / 60))
+        weeks_seen[(event_start.weekday(), minute, duration)].add(event_start.isocalendar()[:2])
+
+    weeks = max(1, round((end - start).days / 7))
+    threshold = max(2, math.ceil(weeks / 2))
+    days_by_time = defaultdict(list)
+    for (day, minute, duration), seen in weeks_seen.items():
+        if len(seen) >= threshold:
+            days_by_time[(minute, duration)].append(day)
+
+    blocks = []
+    for (minute, duration), days in days_by_time.items():
+        if len(days) >= MIN_BLOCK_DAYS:
+            blocks.append((tuple(sorted(days)), minute, duration))
+        else:
+            blocks.extend(((day,), minute, duration) for day in days)
+
+    # Keep the blocks that take the most time each week, then list them in calendar order
+    blocks = sorted(blocks, key=lambda b: -len(b[0]) * b[2])[:MAX_BLOCKS]
+    return sorted(blocks, key=lambda b: (b[0][0], b[1]))
+
+
+def _round(minutes):
+    return int(round(minutes / BLOCK_ROUNDING_MINUTES) * BLOCK_ROUNDING_MINUTES)
+
+
+def _format_minute(minute):
+    return f"{minute // 60 % 24:02d}:{minute % 60:02d}"
+
+
+def _format_days(days):
+    if days == (0, 1, 2, 3, 4, 5, 6):
+        return "Daily"
+    if days == (0, 1, 2, 3, 4):
+        return "Weekdays"
+    return ",".join(DAY_NAMES[d] for d in days)
@@ -0,0 +1,171 @@
+import os
+import re
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from Agents.storage import cache_path
+
+# Serve several Google accounts from one process; otherwise token.pkl is used for everyone
+MULTI_USER = os.getenv("OPSPILOT_MULTI_USER", "").lower() in ("1", "true", "yes")
+IDLE_TIMEOUT = int(os.getenv("OPSPILOT_SESSION_IDLE_MINUTES", "30")) * 60
+MAX_SESSIONS = int(os.getenv("OPSPILOT_MAX_SESSIONS", "100"))
+REAP_INTERVAL = 60
+USER_SQLITE_CACHE_KIB = int(os.getenv("OPSPILOT_USER_SQLITE_CACHE_KB", "512"))  # page cache per user database
+
+# Signed-in user of the code currently running; copied into worker threads by instrumentation.bind
+_user = contextvars.ContextVar("opspilot_user", default=None)
+
+
+class UserSession:
+    """
+    Everything OpsPilot keeps for one signed-in user: credentials, agents and per-user caches,
+    created on first use by `scoped`. Closing the session stops and releases all of them.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.last_seen = time.time()
+        self.resources = {}
+        # Reentrant: building one resource (an agent) may need another (its credentials)
+        self._lock = threading.RLock()
+
+    def path(self, filename):
+        """Per-user file inside the cache directory."""
+        return cache_path(os.path.join("users", user_slug(self.user), filename))
+
+    def resource(self, name, factory):
+        self.last_seen = time.time()
+        with self._lock:
+            if name not in self.resources:
+                self.resources[name] = factory(self)
+            return self.resources[name]
+
+    def close(self):
+        with self._lock:
+            resources, self.resources = self.resources, {}
+        for name, resource in resources.items():
+            close = getattr(resource, "close", None) or getattr(resource, "stop", None)
+            if close:
+                try:
+                    close()
+                except Exception as e:
+                    print(f"⚠️ Could not close {name} of {self.user}: {e}")
+
+
+class SessionRegistry:
+    """
+    Open user sessions. A daemon thread closes sessions idle for more than `idle_timeout`
+    seconds, and the least recently active are closed once more than `max_sessions` are open,
+    so memory stays bounded however many people sign in.
+    """
+
+    def __init__(self, idle_timeout=IDLE_TIMEOUT, max_sessions=MAX_SESSIONS):
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._reaper = None
+
+    def open(self, user):
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(user)
+            if session is None:
+                session = self._sessions[user] = UserSession(user)
+            session.last_seen = now
+            # Checked and evicted in the same critical section, so concurrent sign-ins cannot overshoot
+            victims = self._take_victims(now, keep=session)
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._run, name="session-reaper", daemon=True)
+                self._reaper.start()
+        self._close_all(victims, now)
+        return session
+
+    def close(self, user):
+        with self._lock:
+            session = self._sessions.pop(user, None)
+        if session:
+            session.close()
+
+    def reap(self, now=None):
+        """Closes idle sessions, then the least recently active ones beyond `max_sessions`."""
+        now = now or time.time()
+        with self._lock:
+            victims = self._take_victims(now, idle=True)
+        self._close_all(victims, now)
+        return len(victims)
+
+    def _take_victims(self, now, idle=False, keep=None):
+        """
+        Removes the sessions to close from the registry and returns them: the least recently active
+        beyond `max_sessions`, plus idle ones when `idle` is set. Callers must hold `_lock`.
+        """
+        by_activity = sorted((s for s in self._sessions.values() if s is not keep), key=lambda s: s.last_seen)
+        excess = len(self._sessions) - self.max_sessions
+        victims = [
+            s for i, s in enumerate(by_activity)
+            if i < excess or (idle and now - s.last_seen > self.idle_timeout)
+        ]
+        for session in victims:
+            del self._sessions[session.user]
+        return victims
+
+    def _close_all(self, victims, now):
+        # Outside the registry lock: closing stops workers and may block
+        for session in victims:
+            print(f"🧹 Closing session of {session.user} (idle {now - session.last_seen:.0f}s).")
+            session.close()
+
+    def active(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def _run(self):
+        while True:
+            time.sleep(REAP_INTERVAL)
+            try:
+                self.reap()
+            except Exception as e:
+                print(f"⚠️ Session cleanup failed: {e}")
+
+
+sessions = SessionRegistry()
+
+
+def user_slug(user):
+    """File-name-safe form of a user's email."""
+    return re.sub(r"[^a-z0-9._@-]", "_", user.lower())
+
+
+def current_user():
+    return _user.get()
+
+
+def use_session(user):
+    """Scopes the rest of the current Streamlit run to `user` (None for single-user mode)."""
+    _user.set(user)
+    if user:
+        sessions.open(user)
+
+
+@contextmanager
+def user_scope(user):
+    """Runs the block as `user`, e.g. for background work done on someone's behalf."""
+    token = _user.set(user)
+    try:
+        yield
+    finally:
+        _user.reset(token)
+
+
+def scoped(name, factory, shared):
+    """
+    The signed-in user's `name` resource, built with `factory(session)` on first use.
+    Outside a user scope (single-user mode, prewarm, bench) `shared()` is returned instead.
+    """
+    user = _user.get()
+    if user is None:
+        return shared()
+    return sessions.open(user).resource(name, factory)
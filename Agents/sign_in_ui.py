@@ -0,0 +1,36 @@
+import streamlit as st
+
+from Agents.sessions import use_session
+
+
+def require_user():
+    """
+    Multi-user mode: scopes the run to the signed-in Google account and returns its email.
+    Visitors who are not signed in get the sign-in page and the run stops there.
+    """
+    params = st.query_params
+    if "code" in params and "state" in params:
+        from Agents.credentials import complete_sign_in
+        try:
+            st.session_state.user = complete_sign_in(params["code"], params["state"])
+        except Exception as e:
+            st.error(f"❌ Sign-in failed: {e}")
+        st.query_params.clear()
+
+    user = st.session_state.get("user")
+    if not user:
+        from Agents.credentials import sign_in_url
+        # One consent URL per browser session, so reruns do not start new sign-ins
+        if "sign_in_url" not in st.session_state:
+            st.session_state.sign_in_url = sign_in_url()
+        st.info("🔐 Sign in with your Google account to use OpsPilot.")
+        st.link_button("🔑 Sign in with Google", st.session_state.sign_in_url)
+        st.stop()
+
+    use_session(user)
+    st.sidebar.caption(f"👤 Signed in as {user}")
+    if st.sidebar.button("🚪 Sign out"):
+        st.session_state.pop("user", None)
+        st.session_state.pop("sign_in_url", None)
+        st.rerun()
+    return user
@@ -0,0 +1,85 @@
+import os
+import datetime
+import numpy as np
+
+RESOLUTION_MINUTES = 5
+HORIZON_DAYS = int(os.getenv("SLOT_HORIZON_DAYS", "14"))
+WORK_START_HOUR, WORK_END_HOUR = (int(h) for h in os.getenv("SLOT_WORK_HOURS_UTC", "9-17").split("-"))
+
+
+def occupancy_grid(index, start, end, resolution=RESOLUTION_MINUTES):
+    """
+    Rasterizes every attendee's busy time into a boolean (attendees × cells) grid.
+    Busy intervals are widened to whole cells; unverified attendees are busy throughout.
+    """
+    attendees = index.attendees
+    cells = int((end - start).total_seconds() // (resolution * 60))
+
+    rows, opens, closes = [], [], []
+    for row, email in enumerate(attendees):
+        if email in index.unverified:
+            rows.append(row)
+            opens.append(0.0)
+            closes.append(cells * resolution)
+            continue
+        for busy_start, busy_end in index.intervals(email):
+            rows.append(row)
+            opens.append((busy_start - start).total_seconds() / 60.0)
+            closes.append((busy_end - start).total_seconds() / 60.0)
+
+    # Difference array: +1 where a busy interval opens, -1 where it closes, then cumulative sum
+    diff = np.zeros((len(attendees), cells + 1), dtype=np.int32)
+    if rows:
+        rows = np.asarray(rows)
+        a = np.clip(np.floor(np.asarray(opens) / resolution), 0, cells).astype(np.int64)
+        b = np.clip(np.ceil(np.asarray(closes) / resolution), 0, cells).astype(np.int64)
+        keep = a < b
+        np.add.at(diff, (rows[keep], a[keep]), 1)
+        np.add.at(diff, (rows[keep], b[keep]), -1)
+
+    return np.cumsum(diff, axis=1)[:, :cells] > 0
+
+
+def working_hours_mask(start, cells, resolution=RESOLUTION_MINUTES,
+                       work_hours=(WORK_START_HOUR, WORK_END_HOUR), weekdays_only=True):
+    """Boolean mask of cells that fall inside working hours (UTC)."""
+    offsets = np.arange(cells) * resolution
+    minute_of_day = (start.hour * 60 + start.minute + offsets) % (24 * 60)
+    day = (start.weekday() + (start.hour * 60 + start.minute + offsets) // (24 * 60)) % 7
+    mask = (minute_of_day >= work_hours[0] * 60) & (minute_of_day < work_hours[1] * 60)
+    if weekdays_only:
+        mask &= day < 5
+    return mask
+
+
+def find_free_slots(index, start, end, duration_minutes=30, step_minutes=30,
+                    resolution=RESOLUTION_MINUTES, work_hours=(WORK_START_HOUR, WORK_END_HOUR),
+                    weekdays_only=True):
+    """
+    Every start time in [start, end) where all attendees in `index` are free for
+    `duration_minutes`, inside working hours, on a `step_minutes` grid.
+    `start` should be aligned to `step_minutes`.
+    """
+    grid = occupancy_grid(index, start, end, resolution)
+    cells = grid.shape[1]
+    need = max(1, -(-duration_minutes // resolution))
+    if cells < need:
+        return []
+
+    free = ~grid.any(axis=0) & working_hours_mask(start, cells, resolution, work_hours, weekdays_only)
+
+    # A window is feasible when all `need` consecutive cells are free
+    run = np.concatenate(([0], np.cumsum(free, dtype=np.int32)))
+    window_free = (run[need:] - run[:-need]) == need
+
+    step = max(1, step_minutes // resolution)
+    starts = np.flatnonzero(window_free)
+    starts = starts[starts % step == 0]
+    return [start + datetime.timedelta(minutes=int(i) * resolution) for i in starts]
+
+
+def next_slot_start(now=None, step_minutes=30):
+    """The first `step_minutes` boundary after `now` (naive UTC)."""
+    now = now or datetime.datetime.utcnow()
+    floored = now.replace(second=0, microsecond=0) - datetime.timedelta(minutes=now.minute % step_minutes)
+    return floored + datetime.timedelta(minutes=step_minutes)
@@ -0,0 +1,40 @@
+import os
+import sqlite3
+
+# All persistent caches live side by side in one directory
+CACHE_DIR = os.getenv("OPSPILOT_CACHE_DIR", ".opspilot_cache")
+
+
+def cache_path(filename):
+    """Returns the path of `filename` inside the cache directory, creating directories if needed."""
+    path = os.path.join(CACHE_DIR, filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def connect(path, schema_version, schema, cache_kib=None):
+    """
+    Opens a SQLite database shared across Streamlit threads.
+    When the stored `user_version` differs from `schema_version` every table is dropped
+    and `schema` is applied again, so caches never have to be migrated by hand.
+    `cache_kib` caps SQLite's page cache for this connection.
+    """
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    if cache_kib:
+        conn.execute(f"PRAGMA cache_size=-{int(cache_kib)}")
+
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    if current != schema_version:
+        tables = [r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' "
+            "ORDER BY sql LIKE 'CREATE VIRTUAL%' DESC"
+        )]
+        with conn:
+            for table in tables:
+                conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+            conn.executescript(schema)
+            conn.execute(f"PRAGMA user_version={int(schema_version)}")
+    return conn
@@ -0,0 +1,94 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+from Agents.storage import cache_path, connect
+from Agents.instrumentation import registry
+
+SCHEMA_VERSION = 1
+SUMMARY_TTL = int(os.getenv("SUMMARY_CACHE_TTL_DAYS", "30")) * 24 * 3600
+MAX_ENTRIES = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "5000"))
+
+SCHEMA = """
+CREATE TABLE summaries (
+    key TEXT PRIMARY KEY,
+    summary TEXT,
+    created_at REAL,
+    last_access REAL
+);
+CREATE INDEX summaries_last_access ON summaries (last_access);
+"""
+
+
+def summary_key(subject, body, model, temperature, prompt_version):
+    """Content address of one summarization request."""
+    material = json.dumps([subject, body, model, temperature, prompt_version], ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class SummaryCache:
+    """
+    Persistent memo of LLM summaries keyed by `summary_key`.
+    Entries expire after `ttl` seconds; beyond `max_entries` the least recently used are dropped.
+    """
+
+    def __init__(self, path=None, ttl=SUMMARY_TTL, max_entries=MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = connect(path or cache_path("summaries.db"), SCHEMA_VERSION, SCHEMA)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary, created_at FROM summaries WHERE key=?", (key,)
+            ).fetchone()
+            if row is None or now - row["created_at"] > self.ttl:
+                self.misses += 1
+                registry.record_cache("summary", False)
+                return None
+            with self._conn:
+                self._conn.execute("UPDATE summaries SET last_access=? WHERE key=?", (now, key))
+            self.hits += 1
+            registry.record_cache("summary", True)
+            return row["summary"]
+
+    def put(self, key, summary):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, summary, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, summary, now, now),
+            )
+            self._conn.execute("DELETE FROM summaries WHERE created_at < ?", (now - self.ttl,))
+            self._conn.execute(
+                """
+                DELETE FROM summaries WHERE key IN (
+                    SELECT key FROM summaries ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+
+    def stats(self):
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": size}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_summary_cache():
+    """Process-wide SummaryCache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SummaryCache()
+    return _cache
@@ -0,0 +1,171 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from Agents.instrumentation import bind
+from Agents.Summary_Agent import estimate_prompt_tokens, fit_to_budget
+
+# Groq limits are per API key, so one limiter is shared by every pipeline in the process
+GROQ_RPM = int(os.getenv("GROQ_RPM", "30"))
+GROQ_TPM = int(os.getenv("GROQ_TPM", "6000"))
+MAX_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+COMPLETION_TOKENS = 256   # budgeted per request on top of the prompt
+
+
+class TokenBucket:
+    """Classic token bucket: `capacity` tokens, refilled continuously at `rate` tokens per second."""
+
+    def __init__(self, capacity, rate):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        """Blocks until `amount` tokens are available (capped at capacity), then takes them."""
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute buckets checked together."""
+
+    def __init__(self, rpm=GROQ_RPM, tpm=GROQ_TPM):
+        self.requests = TokenBucket(rpm, rpm / 60.0)
+        self.tokens = TokenBucket(tpm, tpm / 60.0)
+
+    def acquire(self, estimated_tokens):
+        self.requests.acquire(1)
+        self.tokens.acquire(estimated_tokens)
+
+
+_limiter = RateLimiter()
+
+
+class SummaryPipeline:
+    """
+    Summarizes many emails with bounded concurrency under the shared Groq rate limiter.
+    429 responses are retried with backoff by the shared HTTP client.
+    `run` yields results as soon as each one finishes; `stream` also yields tokens as they arrive.
+    """
+
+    def __init__(self, summarizer, max_workers=MAX_CONCURRENCY, limiter=None, batch_budget=None):
+        self.summarizer = summarizer
+        self.max_workers = max_workers
+        self.limiter = limiter or _limiter
+        self.batch_budget = batch_budget
+
+    def _summarize_uncached(self, subject, body, on_token=None):
+        # Single requests, including a pack of one oversized email, are held to the batch budget too
+        prompt = subject + fit_to_budget(body, self.batch_budget)
+        self.limiter.acquire(estimate_prompt_tokens(prompt) + COMPLETION_TOKENS)
+        try:
+            return self.summarizer.request_summary(subject, body, on_token, token_budget=self.batch_budget)
+        except Exception as e:
+            return f"❌ Error: {e}"
+
+    def summarize_pack(self, emails):
+        """
+        Summarizes several emails in one batched request.
+        Items the batch fails to return fall back to single, rate-limited calls.
+        """
+        self.limiter.acquire(sum(
+            estimate_prompt_tokens(e["subject"] + e["body"]) + COMPLETION_TOKENS for e in emails
+        ))
+        try:
+            results = self.summarizer.request_batch(emails, self.batch_budget)
+        except Exception as e:
+            print(f"⚠️ Batch summary failed, falling back to single calls: {e}")
+            results = [None] * len(emails)
+
+        return [
+            summary if summary is not None else self._summarize_uncached(email["subject"], email["body"])
+            for email, summary in zip(emails, results)
+        ]
+
+    def run(self, emails):
+        """Yields (index, summary) pairs in completion order."""
+        if not emails:
+            return
+
+        # Cached summaries are returned straight away
+        pending = []
+        for idx, email in enumerate(emails):
+            cached = self.summarizer.cached_summary(email["subject"], email["body"])
+            if cached is not None:
+                yield idx, cached
+            else:
+                pending.append(idx)
+        if not pending:
+            return
+
+        if self.batch_budget:
+            packs = [
+                [pending[i] for i in pack]
+                for pack in self.summarizer.pack_batches([emails[i] for i in pending], self.batch_budget)
+            ]
+        else:
+            packs = [[idx] for idx in pending]
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(packs))) as pool:
+            futures = {}
+            for pack in packs:
+                if len(pack) == 1:
+                    email = emails[pack[0]]
+                    future = pool.submit(bind(lambda e=email: [self._summarize_uncached(e["subject"], e["body"])]))
+                else:
+                    future = pool.submit(bind(self.summarize_pack), [emails[i] for i in pack])
+                futures[future] = pack
+            for future in as_completed(futures):
+                for idx, summary in zip(futures[future], future.result()):
+                    yield idx, summary
+
+    def stream(self, emails):
+        """
+        Yields (index, text, done) events. While a summary is generated, `text` is the next
+        streamed delta and `done` is False; the final event per email carries the full summary.
+        Every uncached email gets its own streamed request, so packing is not used here.
+        """
+        pending = []
+        for idx, email in enumerate(emails):
+            cached = self.summarizer.cached_summary(email["subject"], email["body"])
+            if cached is not None:
+                yield idx, cached, True
+            else:
+                pending.append(idx)
+        if not pending:
+            return
+
+        events = queue.Queue()
+
+        def work(idx):
+            email = emails[idx]
+            try:
+                summary = self._summarize_uncached(
+                    email["subject"], email["body"], on_token=lambda delta: events.put((idx, delta, False))
+                )
+            except Exception as e:
+                summary = f"❌ Error: {e}"
+            # Always report completion, or the consumer below would wait forever
+            events.put((idx, summary, True))
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(pending))) as pool:
+            for idx in pending:
+                pool.submit(bind(work), idx)
+            remaining = len(pending)
+            while remaining:
+                event = events.get()
+                remaining -= event[2]
+                yield event
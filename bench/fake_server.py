@@ -0,0 +1,489 @@
+# bench/fake_server.py
+"""
+Local stand-in for the Gmail, Google Calendar, OAuth2 userinfo and Groq endpoints OpsPilot uses.
+
+Data is generated deterministically from a seed, so repeated runs see the same mailbox and
+calendars. Latency, error rate and data volume are configurable per run. Every request is
+counted per route so benchmarks can report call counts next to timings.
+
+    python bench/fake_server.py --port 8765 --emails 1000 --latency-ms 30
+
+Point the app at it with:
+
+    OPSPILOT_GOOGLE_API_ROOT=http://127.0.0.1:8765
+    GROQ_API_URL=http://127.0.0.1:8765/openai/v1/chat/completions
+"""
+import re
+import json
+import time
+import base64
+import random
+import hashlib
+import argparse
+import datetime
+import threading
+from collections import Counter
+from dataclasses import dataclass, asdict
+from urllib.parse import urlsplit, parse_qs, unquote
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+USER_EMAIL = "bench@opspilot.dev"
+EPOCH = datetime.datetime(2026, 1, 1)     # "updated" time of every generated event
+FREEBUSY_MAX_ITEMS = 50
+MEETING_HOURS = [9, 11, 13, 16]
+
+
+@dataclass
+class FakeConfig:
+    emails: int = 1000            # messages in the mailbox, all unread
+    people: int = 200             # distinct collaborators appearing on the primary calendar
+    events_per_day: int = 3       # per calendar, on weekdays
+    latency_ms: float = 20.0      # Google API latency per request
+    llm_latency_ms: float = 200.0 # Groq time to first token
+    token_delay_ms: float = 5.0   # Groq delay between streamed tokens
+    jitter: float = 0.2           # +/- fraction applied to every delay
+    error_rate: float = 0.0       # fraction of requests answered 503 (Retry-After: 0)
+    seed: int = 7
+
+
+def _b64(text):
+    return base64.urlsafe_b64encode(text.encode("utf-8")).decode("ascii")
+
+
+def _rfc3339(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _parse_time(value):
+    return datetime.datetime.strptime(value[:19], "%Y-%m-%dT%H:%M:%S")
+
+
+class FakeWorld:
+    """The generated mailbox and calendars, plus everything clients created during the run."""
+
+    def __init__(self, config):
+        self.config = config
+        self.history_id = 1000
+        self.sent = []
+        self.inserted = []
+        self._lock = threading.Lock()
+
+    # ------------------------
+    # Gmail
+    # ------------------------
+    def message_id(self, i):
+        return f"m{i:07d}"
+
+    def message(self, msg_id, full=False):
+        i = int(msg_id[1:])
+        if i >= self.config.emails:
+            return None
+        rng = random.Random(f"{self.config.seed}:{msg_id}")
+        sent_at = datetime.datetime(2026, 10, 1) - datetime.timedelta(minutes=7 * i)
+        subject = f"{rng.choice(['Invoice', 'Outage', 'Hiring', 'Release', 'Budget'])} update #{i}"
+        sender = f"Person {i % self.config.people} <person{i % self.config.people}@example.com>"
+        text = " ".join(rng.choice(["please", "review", "the", "attached", "numbers", "before", "friday",
+                                    "deadline", "team", "customer", "escalation", "thanks"])
+                        for _ in range(rng.randint(40, 160)))
+        headers = [
+            {"name": "Subject", "value": subject},
+            {"name": "From", "value": sender},
+            {"name": "Date", "value": sent_at.strftime("%a, %d %b %Y %H:%M:%S +0000")},
+        ]
+        message = {
+            "id": msg_id,
+            "threadId": msg_id,
+            "labelIds": ["INBOX", "UNREAD"],
+            "snippet": text[:160],
+            "internalDate": str(int((sent_at - datetime.datetime(1970, 1, 1)).total_seconds() * 1000)),
+            "sizeEstimate": len(text) + 600,
+            "historyId": str(self.history_id),
+            "payload": {"mimeType": "text/plain", "headers": headers},
+        }
+        if full:
+            quoted = f"\n\nOn Mon, 1 Sep 2026 at 09:00, someone wrote:\n> earlier message {i}\n> more history"
+            message["payload"] = {
+                "mimeType": "multipart/mixed",
+                "headers": headers,
+                "parts": [
+                    {
+                        "mimeType": "multipart/alternative",
+                        "parts": [
+                            {"mimeType": "text/plain", "body": {"size": len(text), "data": _b64(text + quoted)}},
+                            {"mimeType": "text/html", "body": {"size": len(text), "data": _b64(f"<p>{text}</p>")}},
+                        ],
+                    },
+                    {
+                        "mimeType": "application/pdf",
+                        "filename": f"report-{i}.pdf",
+                        "body": {"size": 250000, "attachmentId": f"att-{msg_id}"},
+                    },
+                ],
+            }
+        return message
+
+    def send(self, raw):
+        with self._lock:
+            self.history_id += 1
+            self.sent.append(raw)
+            return {"id": f"s{len(self.sent):07d}", "threadId": f"s{len(self.sent):07d}", "labelIds": ["SENT"]}
+
+    # ------------------------
+    # Calendar
+    # ------------------------
+    def events(self, calendar_id, time_min=None, time_max=None):
+        """Events of `calendar_id` overlapping [time_min, time_max), generated day by day."""
+        now = datetime.datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        start = time_min or now - datetime.timedelta(days=30)
+        end = time_max or now + datetime.timedelta(days=30)
+        owner = USER_EMAIL if calendar_id == "primary" else calendar_id
+
+        events = []
+        day = datetime.datetime(start.year, start.month, start.day)
+        while day < end:
+            if day.weekday() < 5:
+                rng = random.Random(f"{self.config.seed}:{owner}:{day.date()}")
+                for n in range(self.config.events_per_day):
+                    # Meetings cluster on shared hours, so even large groups keep common free slots
+                    begin = day + datetime.timedelta(hours=rng.choice(MEETING_HOURS), minutes=rng.choice([0, 30]))
+                    finish = begin + datetime.timedelta(minutes=rng.choice([30, 60]))
+                    if finish <= start or begin >= end:
+                        continue
+                    guests = rng.sample(range(self.config.people), k=min(3, self.config.people))
+                    events.append({
+                        "id": hashlib.md5(f"{owner}{day}{n}".encode()).hexdigest(),
+                        "status": "confirmed",
+                        "summary": rng.choice(["Standup", "1:1", "Planning", "Review", "Customer call"]),
+                        "updated": _rfc3339(EPOCH),
+                        "start": {"dateTime": _rfc3339(begin)},
+                        "end": {"dateTime": _rfc3339(finish)},
+                        "attendees": [{"email": owner}] + [{"email": f"person{g}@example.com"} for g in guests],
+                    })
+            day += datetime.timedelta(days=1)
+
+        with self._lock:
+            for event in self.inserted:
+                begin = _parse_time(event["start"]["dateTime"])
+                if event["calendarId"] == calendar_id and begin < end and _parse_time(event["end"]["dateTime"]) > start:
+                    events.append(event)
+        return sorted(events, key=lambda e: e["start"]["dateTime"])
+
+    def insert_event(self, calendar_id, body):
+        with self._lock:
+            event = dict(body)
+            event.update({
+                "id": f"ev{len(self.inserted):06d}",
+                "calendarId": calendar_id,
+                "status": "confirmed",
+                "updated": _rfc3339(datetime.datetime.utcnow()),
+                "htmlLink": f"https://calendar.example.com/event/{len(self.inserted)}",
+            })
+            if "conferenceData" in body:
+                event["conferenceData"] = {"entryPoints": [{"entryPointType": "video", "uri": "https://meet.example.com/bench"}]}
+            self.inserted.append(event)
+            return event
+
+
+# ------------------------
+# Groq / OpenAI-style chat completions
+# ------------------------
+def completion_text(payload):
+    prompt = payload["messages"][-1]["content"]
+    if payload.get("response_format", {}).get("type") == "json_object":
+        count = len(re.findall(r"^### Email \d+", prompt, flags=re.M))
+        return json.dumps({str(i): f"Email {i}: action needed before Friday." for i in range(1, count + 1)})
+    if "Candidate times:" in prompt:
+        candidates = re.findall(r"^- (\d{4}-\d{2}-\d{2} \d{2}:\d{2})", prompt.split("Candidate times:")[1], flags=re.M)
+        return "\n".join(f"- {c}" for c in candidates[:3])
+    if "YYYY-MM-DD HH:MM" in prompt:
+        tomorrow = (datetime.datetime.utcnow() + datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+        return f"- {tomorrow} 10:00\n- {tomorrow} 14:00\n- {tomorrow} 15:30"
+    if "calendar assistant" in prompt:
+        return "Usually free 10:00–12:00 and 14:00–16:00 UTC on weekdays."
+    return "The sender asks the team to review the attached numbers before the Friday deadline."
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "OpsPilotFake/1.0"
+
+    ROUTES = [
+        ("GET", r"/gmail/v1/users/me/messages", "gmail.messages.list"),
+        ("GET", r"/gmail/v1/users/me/messages/([^/]+)", "gmail.messages.get"),
+        ("POST", r"/gmail/v1/users/me/messages/send", "gmail.messages.send"),
+        ("GET", r"/gmail/v1/users/me/profile", "gmail.profile"),
+        ("GET", r"/gmail/v1/users/me/labels/([^/]+)", "gmail.labels.get"),
+        ("GET", r"/gmail/v1/users/me/history", "gmail.history.list"),
+        ("POST", r"/batch/gmail/v1", "gmail.batch"),
+        ("GET", r"/oauth2/v2/userinfo", "oauth2.userinfo"),
+        ("GET", r"/calendar/v3/calendars/([^/]+)/events", "calendar.events.list"),
+        ("POST", r"/calendar/v3/calendars/([^/]+)/events", "calendar.events.insert"),
+        ("POST", r"/calendar/v3/freeBusy", "calendar.freebusy"),
+        ("POST", r"/openai/v1/chat/completions", "groq.chat"),
+    ]
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    # ------------------------
+    # Plumbing
+    # ------------------------
+    @property
+    def world(self):
+        return self.server.world
+
+    @property
+    def config(self):
+        return self.server.world.config
+
+    def _sleep(self, ms):
+        if ms > 0:
+            time.sleep(ms / 1000.0 * random.uniform(1 - self.config.jitter, 1 + self.config.jitter))
+
+    def _dispatch(self, method):
+        url = urlsplit(self.path)
+        self.query = {k: v if len(v) > 1 else v[0] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        self.body = self.rfile.read(length) if length else b""
+
+        for route_method, pattern, name in self.ROUTES:
+            match = re.fullmatch(pattern, url.path)
+            if route_method == method and match:
+                self.server.count(name)
+                self._sleep(self.config.llm_latency_ms if name == "groq.chat" else self.config.latency_ms)
+                if random.random() < self.config.error_rate:
+                    self.server.count("injected_errors")
+                    return self._json({"error": {"code": 503, "message": "Injected failure"}}, 503,
+                                      {"Retry-After": "0"})
+                handler = getattr(self, "_" + name.replace(".", "_"))
+                return handler(*[unquote(g) for g in match.groups()])
+
+        self.server.count("unknown")
+        self._json({"error": {"code": 404, "message": f"No fake for {method} {url.path}"}}, 404)
+
+    def _json(self, payload, status=200, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _payload(self):
+        return json.loads(self.body or b"{}")
+
+    # ------------------------
+    # Gmail
+    # ------------------------
+    def _gmail_messages_list(self):
+        page_size = min(int(self.query.get("maxResults", 100)), 500)
+        offset = int(self.query.get("pageToken", 0))
+        end = min(offset + page_size, self.config.emails)
+        payload = {
+            "messages": [{"id": self.world.message_id(i), "threadId": self.world.message_id(i)} for i in range(offset, end)],
+            "resultSizeEstimate": self.config.emails,
+        }
+        if end < self.config.emails:
+            payload["nextPageToken"] = str(end)
+        self._json(payload)
+
+    def _gmail_messages_get(self, msg_id):
+        message = self.world.message(msg_id, full=self.query.get("format") == "full")
+        if message is None:
+            return self._json({"error": {"code": 404, "message": "Not Found"}}, 404)
+        self._json(message)
+
+    def _gmail_messages_send(self):
+        self._json(self.world.send(self._payload().get("raw", "")))
+
+    def _gmail_profile(self):
+        self._json({
+            "emailAddress": USER_EMAIL,
+            "messagesTotal": self.config.emails,
+            "threadsTotal": self.config.emails,
+            "historyId": str(self.world.history_id),
+        })
+
+    def _gmail_labels_get(self, label_id):
+        self._json({
+            "id": label_id,
+            "name": label_id,
+            "messagesTotal": self.config.emails,
+            "messagesUnread": self.config.emails,
+        })
+
+    def _gmail_history_list(self):
+        if int(self.query.get("startHistoryId", 0)) < 1000:
+            return self._json({"error": {"code": 404, "message": "Requested entity was not found."}}, 404)
+        self._json({"historyId": str(self.world.history_id), "history": []})
+
+    def _gmail_batch(self):
+        boundary = "batch_fake_response"
+        parts = []
+        for i, path in enumerate(re.findall(r"^GET (\S+)", self.body.decode("utf-8"), flags=re.M)):
+            url = urlsplit(path)
+            msg_id = url.path.rsplit("/", 1)[-1]
+            message = self.world.message(msg_id, full="format=full" in url.query)
+            status, body = ("200 OK", message) if message else ("404 Not Found", {"error": {"code": 404}})
+            parts.append(
+                f"--{boundary}\r\n"
+                f"Content-Type: application/http\r\n"
+                f"Content-ID: <response-item{i}>\r\n\r\n"
+                f"HTTP/1.1 {status}\r\n"
+                f"Content-Type: application/json; charset=UTF-8\r\n\r\n"
+                f"{json.dumps(body)}\r\n"
+            )
+        self.server.count("gmail.batch.items", len(parts))
+        data = ("".join(parts) + f"--{boundary}--\r\n").encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", f"multipart/mixed; boundary={boundary}")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _oauth2_userinfo(self):
+        self._json({"email": USER_EMAIL, "name": "Bench User", "verified_email": True})
+
+    # ------------------------
+    # Calendar
+    # ------------------------
+    def _calendar_events_list(self, calendar_id):
+        if "syncToken" in self.query:
+            # Nothing changes between syncs in the generated world except inserted events
+            token = self.query["syncToken"]
+            if not re.fullmatch(r"sync-\d+", token):
+                return self._json({"error": {"code": 410, "message": "Sync token is no longer valid, a full sync is required.",
+                                             "errors": [{"reason": "fullSyncRequired"}]}}, 410)
+            changed = [e for e in self.world.inserted[int(token[5:]):] if e["calendarId"] == calendar_id]
+            return self._json({"items": changed, "nextSyncToken": f"sync-{len(self.world.inserted)}"})
+
+        time_min = _parse_time(self.query["timeMin"]) if "timeMin" in self.query else None
+        time_max = _parse_time(self.query["timeMax"]) if "timeMax" in self.query else None
+        events = self.world.events(calendar_id, time_min, time_max)
+        if "updatedMin" in self.query:
+            updated_min = _parse_time(self.query["updatedMin"])
+            events = [e for e in events if _parse_time(e["updated"]) >= updated_min]
+
+        page_size = min(int(self.query.get("maxResults", 250)), 2500)
+        offset = int(self.query.get("pageToken", 0))
+        payload = {"kind": "calendar#events", "items": events[offset:offset + page_size]}
+        if offset + page_size < len(events):
+            payload["nextPageToken"] = str(offset + page_size)
+        else:
+            payload["nextSyncToken"] = f"sync-{len(self.world.inserted)}"
+        self._json(payload)
+
+    def _calendar_events_insert(self, calendar_id):
+        self._json(self.world.insert_event(calendar_id, self._payload()))
+
+    def _calendar_freebusy(self):
+        body = self._payload()
+        items = body.get("items", [])
+        if len(items) > FREEBUSY_MAX_ITEMS:
+            return self._json({"error": {"code": 400, "message": "Too many calendars requested"}}, 400)
+        time_min, time_max = _parse_time(body["timeMin"]), _parse_time(body["timeMax"])
+        calendars = {
+            item["id"]: {"busy": [
+                {"start": e["start"]["dateTime"], "end": e["end"]["dateTime"]}
+                for e in self.world.events(item["id"], time_min, time_max)
+            ]}
+            for item in items
+        }
+        self._json({"kind": "calendar#freeBusy", "timeMin": body["timeMin"], "timeMax": body["timeMax"],
+                    "calendars": calendars})
+
+    # ------------------------
+    # Groq
+    # ------------------------
+    def _groq_chat(self):
+        payload = self._payload()
+        text = completion_text(payload)
+        prompt_tokens = sum(len(m["content"]) for m in payload["messages"]) // 4 + 1
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(text) // 4 + 1}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if not payload.get("stream"):
+            return self._json({
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "model": payload.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        tokens = re.findall(r"\S+\s*|\s+", text)
+        for n, token in enumerate(tokens):
+            if n:
+                self._sleep(self.config.token_delay_ms)
+            chunk = {"choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+            self._chunk(f"data: {json.dumps(chunk)}\n\n")
+        final = {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "x_groq": {"usage": usage}}
+        self._chunk(f"data: {json.dumps(final)}\n\n")
+        self._chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+
+class FakeServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        super().__init__((host, port), FakeHandler)
+        self.world = FakeWorld(config or FakeConfig())
+        self.counts = Counter()
+        self._count_lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def count(self, name, amount=1):
+        with self._count_lock:
+            self.counts[name] += amount
+
+    def reset_counts(self):
+        with self._count_lock:
+            counts = dict(self.counts)
+            self.counts.clear()
+        return counts
+
+    def start(self):
+        """Serves on a daemon thread and returns self."""
+        threading.Thread(target=self.serve_forever, name="fake-server", daemon=True).start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve fake Gmail, Calendar and Groq APIs for benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    defaults = FakeConfig()
+    for field, value in asdict(defaults).items():
+        parser.add_argument(f"--{field.replace('_', '-')}", type=type(value), default=value)
+    args = parser.parse_args()
+
+    config = FakeConfig(**{field: getattr(args, field) for field in asdict(defaults)})
+    server = FakeServer(config, args.host, args.port)
+    print(f"🧪 Fake APIs listening on {server.url} ({config})")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
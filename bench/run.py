@@ -0,0 +1,244 @@
+# bench/run.py
+"""
+Benchmarks OpsPilot's hot paths against the local fake APIs in bench/fake_server.py.
+
+    python bench/run.py                                  # all scenarios at 10, 100, 1000
+    python bench/run.py --sizes 10,100 --scenarios inbox,report
+    python bench/run.py --error-rate 0.05 --output bench/results/flaky.json
+    python bench/run.py --baseline bench/results/<older commit>.json
+
+Each scenario runs with fresh caches in a temporary directory. Results are written as JSON
+(default bench/results/<commit>.json) with wall time and per-endpoint request counts, so two
+commits can be compared with --baseline.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+import datetime
+from dataclasses import asdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.fake_server import FakeConfig, FakeServer  # noqa: E402
+
+SCENARIOS = ["inbox", "dashboard", "report", "meeting"]
+DEFAULT_SIZES = [10, 100, 1000]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def configure_environment(server, cache_dir):
+    """Points every agent at the fake server. Must run before any Agents module is imported."""
+    os.environ["OPSPILOT_GOOGLE_API_ROOT"] = server.url
+    os.environ["GROQ_API_URL"] = f"{server.url}/openai/v1/chat/completions"
+    os.environ["GROQ_API_KEY"] = "bench"
+    os.environ["OPSPILOT_CACHE_DIR"] = cache_dir
+    # The fake server does not rate limit; keep the client-side limiter out of the measurement
+    os.environ.setdefault("GROQ_RPM", "1000000")
+    os.environ.setdefault("GROQ_TPM", "1000000000")
+
+    # Streamlit calls outside `streamlit run` log a bare-mode warning on every element
+    import streamlit  # noqa: F401
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").disabled = True
+
+
+def fake_credentials():
+    from google.oauth2.credentials import Credentials
+    from Agents.credentials import CredentialProvider
+    return CredentialProvider(creds=Credentials(token="bench-token"), auto_refresh=False)
+
+
+class Bench:
+    def __init__(self, server, cache_dir):
+        self.server = server
+        self.cache_dir = cache_dir
+        self.credentials = fake_credentials()
+        self._runs = 0
+
+    def fresh_path(self, name):
+        self._runs += 1
+        return os.path.join(self.cache_dir, f"{self._runs:04d}-{name}")
+
+    def inbox_agent(self):
+        from Agents.inbox import InboxAgent
+        from Agents.message_store import MessageStore
+        return InboxAgent(store=MessageStore(self.fresh_path("messages.db")), credentials=self.credentials)
+
+    def calendar_agent(self):
+        from Agents.calendar_agent import CalendarAgent
+        return CalendarAgent(credentials=self.credentials)
+
+    # ------------------------
+    # Scenarios: each returns a callable that does the measured work
+    # ------------------------
+    def inbox(self, size):
+        inbox = self.inbox_agent()
+        return lambda: inbox.fetch_all_emails(query="is:unread", max_results=size)
+
+    def dashboard(self, size):
+        from Agents import metrics, event_store
+        self.server.world.config.events_per_day = max(1, size // 5)   # ~`size` events in the 7-day window
+        inbox, calendar = self.inbox_agent(), self.calendar_agent()
+        metrics._shared_state = metrics.DashboardState()
+        event_store._store = event_store.EventStore(self.fresh_path("events.db"))
+        return lambda: metrics.get_dashboard_metrics(inbox, calendar, ttl=0)
+
+    def report(self, size):
+        from Agents.reports import ReportAgent
+        from Agents.summary_cache import SummaryCache
+        from Agents.Summary_Agent import SummaryAgent, GROQ_URL, GROQ_MODEL
+        inbox = self.inbox_agent()
+        emails = inbox.fetch_all_emails(query="is:unread", max_results=size)
+        summarizer = SummaryAgent("bench", GROQ_URL, GROQ_MODEL, cache=SummaryCache(self.fresh_path("summaries.db")))
+        agent = ReportAgent(inbox, summarizer)
+
+        def work():
+            # The same path as ReportAgent.display: bodies loaded on demand, summaries streamed per email
+            for _ in agent.pipeline.stream(inbox.load_for_report(emails)):
+                pass
+        return work
+
+    def meeting(self, size):
+        from Agents import routine_cache, event_store
+        routine_cache._cache = routine_cache.RoutineCache(self.fresh_path("routines.db"))
+        event_store._store = event_store.EventStore(self.fresh_path("events.db"))
+        calendar = self.calendar_agent()
+        attendees = [(f"Person {i}", f"person{i}@example.com", "Engineer") for i in range(size)]
+        return lambda: calendar.suggest_meeting_time(attendees)
+
+
+def run_scenario(bench, scenario, size, repeat):
+    from Agents.instrumentation import registry
+    timings, counts, error = [], {}, None
+    for _ in range(repeat):
+        bench.server.world.config.events_per_day = bench.events_per_day
+        try:
+            work = getattr(bench, scenario)(size)
+            bench.server.reset_counts()
+            registry.reset()
+            started = time.perf_counter()
+            work()
+            timings.append(time.perf_counter() - started)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            break
+        finally:
+            counts = bench.server.reset_counts()
+
+    result = {
+        "scenario": scenario,
+        "size": size,
+        "ok": error is None,
+        "runs": len(timings),
+        "seconds": round(statistics.median(timings), 4) if timings else None,
+        "min_seconds": round(min(timings), 4) if timings else None,
+        "requests": counts,
+        "request_total": sum(v for k, v in counts.items() if k not in ("gmail.batch.items", "injected_errors")),
+        # Client-side view of the last run: cache hit rates and Groq token usage
+        "caches": registry.snapshot()["caches"],
+        "tokens": registry.snapshot()["tokens"],
+    }
+    if error:
+        result["error"] = error
+    return result
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    before = {(r["scenario"], r["size"]): r for r in baseline["results"]}
+    print(f"\n📊 Compared with {baseline.get('commit')} ({baseline_path})")
+    print(f"{'scenario':<12}{'size':>6}{'before s':>12}{'after s':>12}{'change':>10}{'requests':>16}")
+    for r in results:
+        old = before.get((r["scenario"], r["size"]))
+        if not old or not old["seconds"] or r["seconds"] is None:
+            continue
+        change = (r["seconds"] - old["seconds"]) / old["seconds"] * 100
+        print(f"{r['scenario']:<12}{r['size']:>6}{old['seconds']:>12.3f}{r['seconds']:>12.3f}{change:>+9.1f}%"
+              f"{old['request_total']:>8} → {r['request_total']:<6}")
+
+
+def main():
+    defaults = FakeConfig()
+    parser = argparse.ArgumentParser(description="Benchmark OpsPilot against local fake Google and Groq APIs.")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="emails / attendees per run")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"subset of {','.join(SCENARIOS)}")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per scenario and size; the median is reported")
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms)
+    parser.add_argument("--llm-latency-ms", type=float, default=defaults.llm_latency_ms)
+    parser.add_argument("--token-delay-ms", type=float, default=defaults.token_delay_ms)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--events-per-day", type=int, default=defaults.events_per_day)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--output", help="results file (default bench/results/<commit>.json)")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    config = FakeConfig(
+        emails=max(sizes),
+        people=max(200, max(sizes)),
+        events_per_day=args.events_per_day,
+        latency_ms=args.latency_ms,
+        llm_latency_ms=args.llm_latency_ms,
+        token_delay_ms=args.token_delay_ms,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    server = FakeServer(config).start()
+
+    with tempfile.TemporaryDirectory(prefix="opspilot-bench-") as cache_dir:
+        configure_environment(server, cache_dir)
+        bench = Bench(server, cache_dir)
+        bench.events_per_day = args.events_per_day
+
+        results = []
+        for scenario in scenarios:
+            for size in sizes:
+                print(f"⏱️ {scenario} @ {size}...", flush=True)
+                result = run_scenario(bench, scenario, size, args.repeat)
+                status = f"{result['seconds']:.3f}s" if result["ok"] else f"❌ {result['error']}"
+                print(f"   {status} · {result['request_total']} requests", flush=True)
+                results.append(result)
+
+    server.shutdown()
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "created_at": datetime.datetime.utcnow().isoformat() + "Z",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": asdict(config),
+        "results": results,
+    }
+    output = args.output or os.path.join(ROOT, "bench", "results", f"{commit}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {output}")
+
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
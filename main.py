@@ -1,13 +1,16 @@
 # main.py
 import os
+import time
 import streamlit as st
-os.system('pip install python-dotenv')
 from dotenv import load_dotenv
-import os
 
 # Load environment variables
 load_dotenv()
 
+# Page-switch latency budget (ms) for a warm process
+PAGE_BUDGET_MS = int(os.getenv("PAGE_BUDGET_MS", "1000"))
+page_started = time.perf_counter()
+
 
 # ------------------------
 # 🚀 App Config
@@ -15,15 +18,28 @@ load_dotenv()
 st.set_page_config(page_title="OpsPilot | BLACKBOX.AI Track", layout="wide")
 st.title("🧠 OpsPilot: AI-Powered Operations for Developers")
 
+# ------------------------
+# 👥 Multi-user mode: every page below runs with the signed-in account's agents and caches
+# ------------------------
+from Agents.sessions import MULTI_USER
+if MULTI_USER:
+    from Agents.sign_in_ui import require_user
+    require_user()
+
 # ------------------------
 # 📂 Sidebar Navigation
 # ------------------------
 st.sidebar.title("📂 Navigation")
 page = st.sidebar.radio(
     "Select Feature",
-    ["🏠 Home","📈 Dashboard", "📥 Inbox", "📊 Reports", "📅 Meetings"],
+    ["🏠 Home","📈 Dashboard", "📥 Inbox", "📊 Reports", "📅 Meetings", "⚡ Performance"],
     index=0
 )
+
+# Tag every external call made during this run with the page that triggered it
+from Agents.instrumentation import set_page
+set_page(page)
+
 if page == "🏠 Home":
     st.markdown("""
         <style>
@@ -70,42 +86,44 @@ if page == "🏠 Home":
 
 # ------------------------
 elif page == "📈 Dashboard":
-    from Agents.inbox import InboxAgent
-    from Agents.calendar_agent import CalendarAgent
+    from Agents.registry import get_inbox_agent, get_calendar_agent
     from Agents.dashboard import display_dashboard
 
-    inbox = InboxAgent()
-    calendar = CalendarAgent()
-    display_dashboard(inbox, calendar)
+    display_dashboard(get_inbox_agent(), get_calendar_agent())
 
 elif page == "📥 Inbox":
-    from Agents.inbox import InboxAgent, display_inbox_ui
+    from Agents.registry import get_inbox_agent
+    from Agents.inbox import display_inbox_ui
 
-    inbox = InboxAgent()
-    display_inbox_ui(inbox)
+    display_inbox_ui(get_inbox_agent())
 
 elif page == "📊 Reports":
-    from Agents.inbox import InboxAgent
-    from Agents.Summary_Agent import SummaryAgent
+    from Agents.registry import get_inbox_agent, get_summary_agent
     from Agents.reports import ReportAgent
 
-    inbox = InboxAgent()
-    summarizer = SummaryAgent(
-        api_key=os.getenv("GROQ_API_KEY"),
-        api_url="https://api.groq.com/openai/v1/chat/completions",
-        model="llama3-70b-8192"
-    )
-    ReportAgent(inbox, summarizer).display()
+    ReportAgent(get_inbox_agent(), get_summary_agent()).display()
 
 elif page == "📅 Meetings":
-    from Agents.calendar_agent import CalendarAgent
+    from Agents.registry import get_calendar_agent
     from Agents.meeting_ui import display_meetings
 
-    calendar = CalendarAgent()
-    display_meetings(calendar)
+    display_meetings(get_calendar_agent())
+
+elif page == "⚡ Performance":
+    from Agents.performance_ui import display_performance
+
+    display_performance()
 
 # ------------------------
 # 📝 Footer
 # ------------------------
 st.markdown("---")
 st.caption("🚀 BLACKBOX.AI Hackathon · Integrated with Groq, Gmail, Calendar, MCP · Team OpsPilot")
+
+# ------------------------
+# ⏱️ Page latency budget
+# ------------------------
+elapsed_ms = (time.perf_counter() - page_started) * 1000
+st.sidebar.caption(f"⏱️ {page} rendered in {elapsed_ms:.0f} ms (budget {PAGE_BUDGET_MS} ms)")
+if elapsed_ms > PAGE_BUDGET_MS:
+    print(f"⚠️ {page} took {elapsed_ms:.0f} ms, over the {PAGE_BUDGET_MS} ms budget")
@@ -0,0 +1,116 @@
+# prewarm.py
+"""
+Headless prewarm worker for OpsPilot.
+
+Syncs the unread mailbox, precomputes summaries for new unread messages and refreshes
+routine profiles for frequent collaborators, writing everything into the persistent
+caches the Streamlit pages read. Run it from cron or leave it looping:
+
+    python prewarm.py --once
+    python prewarm.py --interval 15
+    python prewarm.py --once --user alice@example.com   # a multi-user account (tokens/ dir)
+"""
+import os
+import time
+import argparse
+import datetime
+from collections import Counter
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+def sync_and_summarize(max_emails):
+    from Agents.inbox import InboxAgent, INBOX_SYNC_SIZE
+    from Agents.Summary_Agent import SummaryAgent, GROQ_URL, GROQ_MODEL, BATCH_TOKEN_BUDGET
+    from Agents.summary_pipeline import SummaryPipeline
+
+    inbox = InboxAgent()
+    # Mirrors are keyed by (query, max_results); by default this is the one the Inbox page reads
+    emails = inbox.sync_emails(query="is:unread", max_results=max_emails or INBOX_SYNC_SIZE, refresh=True)
+    print(f"📥 Mailbox synced: {len(emails)} unread messages.")
+
+    if not os.getenv("GROQ_API_KEY"):
+        print("⚠️ GROQ_API_KEY missing; skipping summaries.")
+        return
+
+    summarizer = SummaryAgent(api_key=os.getenv("GROQ_API_KEY"), api_url=GROQ_URL, model=GROQ_MODEL)
+    emails = inbox.load_for_report(emails)
+    pending = [e for e in emails if summarizer.cached_summary(e["subject"], e["body"]) is None]
+
+    pipeline = SummaryPipeline(summarizer, batch_budget=BATCH_TOKEN_BUDGET)
+    failed = sum(1 for _, summary in pipeline.run(pending) if summary.startswith("❌"))
+    print(f"🧠 Summaries: {len(emails) - len(pending)} already cached, "
+          f"{len(pending) - failed} new, {failed} failed.")
+
+
+def frequent_collaborators(calendar, days_back, limit):
+    """Attendees who share the most events with the user over the last `days_back` days."""
+    from Agents.event_store import get_event_store
+
+    store = get_event_store()
+    store.sync(calendar.service, "primary")
+    now = datetime.datetime.utcnow()
+    counts = Counter(
+        attendee["email"]
+        for event in store.events("primary", now - datetime.timedelta(days=days_back), now)
+        for attendee in event["attendees"]
+        if attendee["email"] != calendar.user_email
+    )
+    return [email for email, _ in counts.most_common(limit)]
+
+
+def refresh_routines(days_back, limit):
+    from Agents.calendar_agent import CalendarAgent
+    from Agents.llm_negotiator import get_routine
+
+    if not os.getenv("GROQ_API_KEY"):
+        print("⚠️ GROQ_API_KEY missing; skipping routine profiles.")
+        return
+
+    calendar = CalendarAgent()
+    collaborators = frequent_collaborators(calendar, days_back, limit)
+    refreshed = 0
+    for email in collaborators:
+        _, from_cache = get_routine(calendar.service, email, warn=print)
+        refreshed += not from_cache
+    print(f"📅 Routine profiles: {len(collaborators)} collaborators, {refreshed} refreshed.")
+
+
+def run_once(args):
+    from Agents.sessions import user_scope
+
+    started = time.perf_counter()
+    for step, fn in (
+        ("mailbox", lambda: sync_and_summarize(args.max_emails)),
+        ("routines", lambda: refresh_routines(args.days, args.collaborators)),
+    ):
+        try:
+            with user_scope(args.user):
+                fn()
+        except Exception as e:
+            print(f"❌ Prewarm step '{step}' failed: {e}")
+    print(f"✅ Prewarm finished in {time.perf_counter() - started:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute OpsPilot summaries and routine profiles.")
+    parser.add_argument("--once", action="store_true", help="run a single pass and exit")
+    parser.add_argument("--interval", type=float, default=15, help="minutes between passes")
+    parser.add_argument("--max-emails", type=int, default=None,
+                        help="unread messages to sync and summarize (default: the Inbox page's OPSPILOT_INBOX_SYNC_SIZE)")
+    parser.add_argument("--collaborators", type=int, default=10, help="routine profiles to keep warm")
+    parser.add_argument("--days", type=int, default=30, help="calendar history used to find collaborators")
+    parser.add_argument("--user", help="signed-in account to prewarm in multi-user mode (default: token.pkl)")
+    args = parser.parse_args()
+
+    while True:
+        run_once(args)
+        if args.once:
+            break
+        time.sleep(args.interval * 60)
+
+
+if __name__ == "__main__":
+    main()
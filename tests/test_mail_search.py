@@ -0,0 +1,71 @@
+import datetime
+
+import pytest
+
+from Agents.mail_search import parse_query, UnsupportedQueryError
+
+NOW = datetime.datetime(2025, 7, 1)
+MAILBOXES = {"is:unread"}
+
+
+def parse(text, complete=()):
+    return parse_query(text, mailboxes=MAILBOXES, complete_mailboxes=complete, now=NOW)
+
+
+@pytest.mark.parametrize("text", [
+    "release notes",
+    '"release notes"',
+    "from:alice",
+    'subject:"weekly report"',
+    "-draft",
+    "-from:bob",
+    "is:unread",
+    "-is:unread",
+    "after:2025/06/01",
+    "before:2025-06-30",
+    "newer_than:7d",
+    "older_than:1y",
+    "bob AND alice",
+    '"bob OR alice"',
+    '"(draft)"',
+])
+def test_answered_locally(text):
+    parse(text)
+
+
+@pytest.mark.parametrize("text", [
+    "bob OR alice",
+    "from:bob OR from:alice",
+    "{bob alice}",
+    "(bob alice)",
+    "from:(bob alice)",
+    "-(draft)",
+    "is:starred",
+    "in:inbox",
+    "is:read",
+    "has:attachment",
+    "to:bob",
+    "label:work",
+    "after:yesterday",
+    "newer_than:7w",
+])
+def test_sent_to_gmail(text):
+    with pytest.raises(UnsupportedQueryError):
+        parse(text)
+
+
+def test_is_read_needs_a_complete_unread_mirror():
+    query = parse("is:read", complete=("is:unread",))
+    assert query.not_mailboxes == ["is:unread"] and not query.mailboxes
+
+
+def test_terms_and_exclusions():
+    query = parse('from:alice "q3 numbers" AND -draft')
+    assert query.match == 'sender : "alice" AND "q3 numbers"'
+    assert query.exclude == '"draft"'
+
+
+def test_dates():
+    query = parse("after:2025/06/01 older_than:10d")
+    assert query.after == int(datetime.datetime(2025, 6, 1, tzinfo=datetime.timezone.utc).timestamp() * 1000)
+    assert query.before == int(datetime.datetime(2025, 6, 21, tzinfo=datetime.timezone.utc).timestamp() * 1000)